@@ -0,0 +1,77 @@
+'''Benchmark the baseband preview pass on a synthetic recording'''
+'''Run from BackEnd/: python -m benchmarks.bench_baseband [--size-mb 2048] [--format w16]
+Writes a throwaway file of int16 (or float32) I/Q holding a drifting tone in noise. The file
+is read straight after being written, so this measures the page-cache path; on a cold
+cache the pass is bounded by disk read speed instead'''
+
+import argparse
+import os
+import resource
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from src.baseband import BasebandFile, compute_preview
+
+SAMPLERATE = 2.4e6
+
+
+def write_synthetic(path, fmt, size_mb, chunk_samples=1 << 20):
+    """A tone sweeping across the band in noise, written chunk by chunk so memory stays flat"""
+    dtype = np.float32 if fmt == 'cf32' else np.int16
+    samples = size_mb * (1 << 20) // (np.dtype(dtype).itemsize * 2)
+    rng = np.random.default_rng(0)
+    noise = 0.05 * (rng.standard_normal(chunk_samples) + 1j * rng.standard_normal(chunk_samples))
+    with open(path, 'wb') as f:
+        if fmt == 'w16':
+            data_bytes = samples * 4
+            f.write(b'RIFF' + struct.pack('<I', 36 + data_bytes) + b'WAVE')
+            f.write(b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 2, int(SAMPLERATE), int(SAMPLERATE) * 4, 4, 16))
+            f.write(b'data' + struct.pack('<I', data_bytes & 0xFFFFFFFF))
+        phase = 0.0
+        for start in range(0, samples, chunk_samples):
+            n = min(chunk_samples, samples - start)
+            t = (start + np.arange(n)) / samples
+            freq = (t - 0.5) * 0.8 * np.pi  # radians per sample, sweeping across ±0.2 of the sample rate
+            tone = np.exp(1j * (phase + np.cumsum(freq)))
+            phase = float(np.angle(tone[-1]))
+            iq = 0.3 * tone + noise[:n]
+            interleaved = np.empty(2 * n, dtype=np.float32)
+            interleaved[0::2] = iq.real
+            interleaved[1::2] = iq.imag
+            if dtype is np.int16:
+                interleaved = (interleaved * 32767).astype(np.int16)
+            f.write(interleaved.tobytes())
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=2048)
+    parser.add_argument('--format', default='w16', choices=('w16', 'cs16', 'cf32'))
+    parser.add_argument('--dir', default=None, help='where to write the synthetic file (default: system temp)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        path = os.path.join(tmp, f'synthetic.{"wav" if args.format == "w16" else args.format}')
+        t0 = time.perf_counter()
+        samples = write_synthetic(path, args.format, args.size_mb)
+        size_mb = os.path.getsize(path) / (1 << 20)
+        print(f'wrote {size_mb:,.0f} MB ({samples:,} samples) in {time.perf_counter() - t0:.1f} s')
+
+        baseband = BasebandFile(path, samplerate=SAMPLERATE)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.perf_counter()
+        preview = compute_preview(baseband)
+        elapsed = time.perf_counter() - t0
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(f'preview:  {size_mb / elapsed:,.0f} MB/s, {samples / elapsed / 1e6:,.0f} MS/s '
+              f'({elapsed:.2f} s, waterfall {preview["waterfall"].shape}, {len(preview["power"])} power points)')
+        # ru_maxrss is KiB on Linux
+        print(f'peak RSS grew by {(rss_after - rss_before) / 1024:,.0f} MB for a {size_mb:,.0f} MB file')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''Benchmark local SGP4 pass prediction against the N2YO visualpasses call'''
+'''Run from BackEnd/: python -m benchmarks.bench_passes [--sats 50] [--observers 5] [--days 2]
+The N2YO half only runs when N2YO_API_KEY is set, since every call counts against the quota'''
+
+import argparse
+import os
+import time
+
+import numpy as np
+from sgp4.api import Satrec, WGS72
+
+from src.pass_predict import Observer, Satellite, make_satellite, predict_passes
+from src.n2yo_call import fetch_visualPasses
+
+ISS_TLE = ('1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  9005',
+           '2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391  2858')
+
+
+def synthetic_satellites(count, epoch):
+    """LEO satellites spread over inclination, RAAN and mean anomaly"""
+    rng = np.random.default_rng(0)
+    satellites = []
+    for i in range(count):
+        satrec = Satrec()
+        satrec.sgp4init(WGS72, 'i', 90000 + i, epoch - 2433281.5, 1e-4, 0.0, 0.0,
+                        rng.uniform(0, 0.002), np.radians(rng.uniform(0, 360)),
+                        np.radians(rng.uniform(45, 99)), np.radians(rng.uniform(0, 360)),
+                        rng.uniform(14.0, 15.8) * 2 * np.pi / 1440.0, np.radians(rng.uniform(0, 360)))
+        satellites.append(Satellite(90000 + i, f'SYN-{i}', satrec))
+    return satellites
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sats', type=int, default=50)
+    parser.add_argument('--observers', type=int, default=5)
+    parser.add_argument('--days', type=float, default=2)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    iss = make_satellite(None, 'ISS', *ISS_TLE)
+    satellites = [iss] + synthetic_satellites(args.sats - 1, iss.satrec.jdsatepoch + iss.satrec.jdsatepochF)
+    observers = [Observer(41.702 + 2 * i, -76.014 + 3 * i, 0) for i in range(args.observers)]
+    start = (iss.satrec.jdsatepoch + iss.satrec.jdsatepochF - 2440587.5) * 86400.0
+
+    best = float('inf')
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        results = predict_passes(satellites, observers, start=start, days=args.days, min_elevation=10)
+        best = min(best, time.perf_counter() - t0)
+    pairs = len(satellites) * len(observers)
+    passes = sum(r['info']['passescount'] for row in results for r in row)
+    print(f'local: {pairs} satellite/observer pairs, {passes} passes, '
+          f'{best * 1000:.1f} ms total, {best / pairs * 1000:.2f} ms per pair')
+
+    api_key = os.getenv('N2YO_API_KEY')
+    if not api_key:
+        print('n2yo: skipped (set N2YO_API_KEY to compare)')
+        return
+    timings = []
+    for observer in observers[:args.repeat]:
+        t0 = time.perf_counter()
+        fetch_visualPasses(25544, observer.lat, observer.lng, observer.alt, int(args.days), 0, api_key)
+        timings.append(time.perf_counter() - t0)
+    per_call = sum(timings) / len(timings)
+    print(f'n2yo: {per_call * 1000:.1f} ms per pair, '
+          f'~{per_call * pairs:.1f} s for the same {pairs} pairs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''Benchmark bulk Positions ingestion against one ORM insert and commit per sample'''
+'''Run from BackEnd/: python -m benchmarks.bench_positions [--rows 200000] [--single-rows 2000]
+Uses a throwaway SQLite file so satellite.db is never touched'''
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from flask import Flask
+
+from database import db, init_db
+from models import Data, Positions
+from src.positions_ingest import POSITION_FIELDS, bulk_insert_positions
+
+
+def synthetic_track(rows, start=1.7e9):
+    """One sample per second of plausible-looking position data"""
+    rng = np.random.default_rng(0)
+    track = {field: rng.uniform(-90, 90, rows) for field in POSITION_FIELDS}
+    track['timestamp'] = start + np.arange(rows, dtype=np.float64)
+    return track
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--single-rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tmp, "bench.db")}'
+        init_db(app)
+        with app.app_context():
+            single = Data(title='single', filepath='single', satellite='SYN')
+            bulk = Data(title='bulk', filepath='bulk', satellite='SYN')
+            db.session.add_all([single, bulk])
+            db.session.commit()
+
+            track = synthetic_track(args.single_rows)
+            t0 = time.perf_counter()
+            for i in range(args.single_rows):
+                db.session.add(Positions(data_id=single.id, title=single.title,
+                                         **{field: float(track[field][i]) for field in POSITION_FIELDS}))
+                db.session.commit()
+            single_rate = args.single_rows / (time.perf_counter() - t0)
+            print(f'single insert: {single_rate:,.0f} rows/s ({args.single_rows} rows)')
+
+            track = synthetic_track(args.rows)
+            t0 = time.perf_counter()
+            written = bulk_insert_positions(bulk.id, track, title=bulk.title)
+            bulk_rate = written / (time.perf_counter() - t0)
+            print(f'bulk insert:   {bulk_rate:,.0f} rows/s ({written} rows), {bulk_rate / single_rate:.0f}x faster')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+'''Offline load test: the Flask app against a local N2YO stub, reporting latency and /metrics'''
+'''Run from BackEnd/: python -m benchmarks.load_test [--requests 2000] [--concurrency 16] [--stub-latency 0.15]
+The stub answers visualpasses and tle calls after a fixed delay, and the app runs on a
+throwaway SQLite file, so the run needs no network and never touches satellite.db'''
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+VISUAL_PASSES = re.compile(r'/visualpasses/(\d+)/([-\d.]+)/([-\d.]+)/([-\d.]+)/(\d+)/(\d+)')
+TLE = re.compile(r'/tle/(\d+)')
+ISS_TLE = ('1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  9005\n'
+           '2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391 12345')
+
+
+class N2YOStub(BaseHTTPRequestHandler):
+    latency = 0.15
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        match = VISUAL_PASSES.search(self.path)
+        if match:
+            satid, days = int(match.group(1)), int(match.group(5))
+            start = int(time.time()) + 3600
+            body = {'info': {'satid': satid, 'satname': f'SAT {satid}', 'transactionscount': 1, 'passescount': days},
+                    'passes': [{'startAz': 300.0, 'startAzCompass': 'WNW', 'startEl': 10.0, 'startUTC': start + i * 86400,
+                                'maxAz': 210.0, 'maxAzCompass': 'SSW', 'maxEl': 45.0, 'maxUTC': start + i * 86400 + 300,
+                                'endAz': 120.0, 'endAzCompass': 'ESE', 'endEl': 10.0, 'endUTC': start + i * 86400 + 600,
+                                'mag': -2.1, 'duration': 600} for i in range(days)]}
+        elif TLE.search(self.path):
+            satid = int(TLE.search(self.path).group(1))
+            body = {'info': {'satid': satid, 'satname': 'ISS (ZARYA)', 'transactionscount': 1}, 'tle': ISS_TLE}
+        else:
+            body = {'error': 'unknown endpoint'}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--stub-latency', type=float, default=0.15, help='seconds the N2YO stub waits before answering')
+    parser.add_argument('--observers', type=int, default=20, help='distinct observer locations, i.e. N2YO cache keys')
+    args = parser.parse_args()
+
+    N2YOStub.latency = args.stub_latency
+    stub = start_server(ThreadingHTTPServer(('127.0.0.1', 0), N2YOStub))
+    tmp = tempfile.TemporaryDirectory()
+    # The stub URL and the database location are read when the app modules are imported
+    os.environ['N2YO_API_URL'] = f'http://127.0.0.1:{stub.server_port}/rest/v1/satellite'
+    import config
+    config.Config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(tmp.name, "load.db")}'
+    from werkzeug.serving import make_server
+    import flask_app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    app_server = start_server(make_server('127.0.0.1', 0, flask_app.app, threaded=True))
+    base = f'http://127.0.0.1:{app_server.server_port}'
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+    session.post(f'{base}/satellite/tle', json={'ids': [25544]}).raise_for_status()
+    with flask_app.app.app_context():
+        data = flask_app.Data(title='load', filepath='load', satellite='ISS')
+        flask_app.db.session.add(data)
+        flask_app.db.session.commit()
+        data_id = data.id
+    session.post(f'{base}/data/{data_id}/positions', json={'positions': [
+        {'satlatitude': 0, 'satlongitude': i / 10, 'sataltitude': 420, 'azimuth': 0, 'elevation': i % 90,
+         'ra': 0, 'dec': 0, 'timestamp': 1.7e9 + i} for i in range(5000)]})
+
+    rng = random.Random(0)
+    observers = [(round(rng.uniform(-60, 60), 3), round(rng.uniform(-180, 180), 3)) for _ in range(args.observers)]
+    # Weighted mix of what the dashboard and tracker pages call
+    scenarios = [
+        ('visual-passes n2yo', 5, lambda: session.post(f'{base}/satellite/visual-passes', json=dict(
+            zip(('observer_lat', 'observer_lng'), rng.choice(observers)), id=25544, source='n2yo'))),
+        ('visual-passes local', 2, lambda: session.post(f'{base}/satellite/visual-passes', json=dict(
+            zip(('observer_lat', 'observer_lng'), rng.choice(observers)), id=25544, source='local'))),
+        ('positions', 3, lambda: session.get(f'{base}/data/{data_id}/positions?limit=1000')),
+        ('jobs', 2, lambda: session.get(f'{base}/jobs')),
+        ('n2yo-stats', 1, lambda: session.get(f'{base}/satellite/n2yo-stats')),
+    ]
+    names = [name for name, weight, _ in scenarios for _ in range(weight)]
+    calls = {name: call for name, _, call in scenarios}
+    latencies = {name: [] for name in calls}
+    errors = {name: 0 for name in calls}
+
+    def one(name):
+        start = time.perf_counter()
+        response = calls[name]()
+        latencies[name].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors[name] += 1
+
+    plan = [rng.choice(names) for _ in range(args.requests)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(one, plan))
+    elapsed = time.perf_counter() - t0
+
+    print(f'{args.requests} requests, concurrency {args.concurrency}, stub latency {args.stub_latency * 1000:.0f} ms: '
+          f'{args.requests / elapsed:,.0f} req/s over {elapsed:.1f} s')
+    print(f'{"scenario":<22}{"count":>7}{"errors":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}')
+    for name, values in latencies.items():
+        print(f'{name:<22}{len(values):>7}{errors[name]:>8}{percentile(values, 0.5) * 1000:>9.1f}'
+              f'{percentile(values, 0.95) * 1000:>9.1f}{percentile(values, 0.99) * 1000:>9.1f}')
+
+    # Server-side view of the same run
+    wanted = ('n2yo_upstream_duration_seconds_count', 'n2yo_upstream_duration_seconds_sum', 'n2yo_cache{stat="hits"}',
+              'n2yo_cache{stat="coalesced"}', 'db_query_duration_seconds_count', 'db_query_duration_seconds_sum')
+    for line in session.get(f'{base}/metrics').text.splitlines():
+        if line.startswith(wanted):
+            print(line)
+
+    app_server.shutdown()
+    stub.shutdown()
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -8,4 +8,45 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(basedir, "satellite.db")}'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False  # Disable to save resources
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False  # Disable to save resources
+
+    # SatDump job manager
+    JOB_WORKERS = 2
+    DEVICE_JOB_WORKERS = 1  # extra workers only SDR jobs may use, so a pass never waits behind a decode
+    JOB_HISTORY = 200
+    JOB_TIMEOUT = 3600  # seconds, hard stop for any single SatDump run
+
+    # Local pass prediction: older TLEs drift by kilometres a day, so 'auto' asks N2YO instead
+    TLE_MAX_AGE_DAYS = float(os.getenv('TLE_MAX_AGE_DAYS', 3))
+    PREDICT_MAX_DAYS = 10  # same window N2YO allows
+    PREDICT_MAX_SATELLITES = 500
+    PREDICT_MAX_OBSERVERS = 20
+
+    # Pass-driven capture scheduler
+    CAPTURE_OUTPUT_DIR = os.path.join(basedir, 'captures')
+    CAPTURE_DRY_RUN = os.getenv('CAPTURE_DRY_RUN', '0') == '1'  # log captures instead of running SatDump
+    CAPTURE_LEAD_SECONDS = 2  # fire this early so SatDump is streaming by AOS
+    CAPTURE_RETUNE_GAP = 10  # minimum seconds between two captures on the same SDR
+    CAPTURE_JOB_GRACE = 60  # extra seconds past LOS before the job manager kills a capture
+
+    # Antenna rotator / pointing loop
+    ROTATOR_BACKEND = os.getenv('ROTATOR_BACKEND', 'simulator')  # simulator, rotctld or serial
+    ROTCTLD_HOST = os.getenv('ROTCTLD_HOST', 'localhost')
+    ROTCTLD_PORT = int(os.getenv('ROTCTLD_PORT', 4533))
+    ROTATOR_SERIAL_PORT = os.getenv('ROTATOR_SERIAL_PORT', 'COM3')
+    ROTATOR_LIMITS = {'az_min': 0.0, 'az_max': 360.0, 'el_min': 0.0, 'el_max': 90.0,
+                      'az_speed': 6.0, 'el_speed': 6.0}
+    TRACKING_RATE = 20  # Hz
+
+    # Image gallery: SatDump products are indexed from IMAGE_ROOT, derived files cached in IMAGE_CACHE_DIR
+    IMAGE_ROOT = os.getenv('SATDUMP_OUTPUT_DIR', os.path.join(basedir, 'captures'))
+    IMAGE_CACHE_DIR = os.path.join(basedir, 'image_cache')
+    IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+    THUMBNAIL_SIZE = 256
+    TILE_SIZE = 256
+
+    # Baseband quick-look previews (.npz + waterfall .png), one pair per Data row
+    BASEBAND_PREVIEW_DIR = os.path.join(basedir, 'baseband_previews')
+
+    # Instrumentation: requests slower than this are stack-sampled and kept for /metrics/slow-requests (0 = off)
+    PROFILE_SLOW_REQUEST_MS = float(os.getenv('PROFILE_SLOW_REQUEST_MS', 0))
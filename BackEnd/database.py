@@ -4,14 +4,40 @@
 #DATABASE FILE, INITIALIZE THE DATABASE AND CREATE THE TABLES
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from datetime import datetime
+import sqlite3
 
 db = SQLAlchemy()
 
+# WAL lets readers keep going while a long pass is being written, NORMAL sync is safe under WAL
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': -64000,  # negative means KiB, so 64 MB
+    'busy_timeout': 5000,
+}
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply SQLITE_PRAGMAS to every new SQLite connection"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
 def init_db(app):
     """Initialize the database with the Flask app"""
     db.init_app(app)
     
     with app.app_context():
         # Create all tables
-        db.create_all()
\ No newline at end of file
+        db.create_all()
+        # create_all skips tables that already exist, so add indexes introduced since then
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
\ No newline at end of file
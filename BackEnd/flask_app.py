@@ -1,21 +1,77 @@
 #JUSTIN ISARAPHANICH 9/3/2025 LAST MODIFIED
 #FLASK APP FILE, CREATE THE FLASK APP AND THE ROUTES
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
 from config import Config
 from database import db, init_db
-from models import Data, Positions
-from src.sd_control import live_process, record_process, offline_process
-from src.n2yo_call import fetch_visualPasses
-import threading
+from models import Data, Positions, ImageFile
+from src.sd_control import live_process, record_process, offline_process, capture_process
+from src.n2yo_call import fetch_visualPasses, fetch_tle, cache_stats
+from src.positions_ingest import bulk_insert_positions
+from src import position_history
+from src.pass_predict import Observer, predict_passes, store_tles, load_satellites, look_track, tle_info
+from src.job_manager import JobManager, QUEUED, RUNNING
+from src.events import EventBus, stream_sse
+from src.capture_scheduler import CaptureScheduler
+from src import tracking
+from src.image_service import ImageService, etag_for
+from src import baseband
+from src import metrics
+from sqlalchemy.orm import contains_eager
+from datetime import datetime
+import os
+import time
+import numpy as np
 
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+metrics.instrument_sqlalchemy()
 init_db(app)
 CORS(app)
+profiler = metrics.instrument_app(app, app.config['PROFILE_SLOW_REQUEST_MS'] / 1000.0)
+events = EventBus()
+
+def publish_job_event(event_type, data):
+    events.publish(event_type, data)
+    metrics.observe_job_event(event_type, data)
+
+jobs = JobManager(workers=app.config['JOB_WORKERS'], history=app.config['JOB_HISTORY'], listener=publish_job_event,
+                  device_workers=app.config['DEVICE_JOB_WORKERS'])
+metrics.track_jobs(jobs)
+metrics.track_n2yo_cache(cache_stats)
+
+def start_scheduled_capture(scheduled, duration):
+    # Called by the capture scheduler at AOS: log the capture as a Data row and queue SatDump
+    profile = scheduled.profile
+    name = f"{scheduled.satname.replace(' ', '_')}_{datetime.utcfromtimestamp(scheduled.aos):%Y%m%d_%H%M%S}"
+    os.makedirs(app.config['CAPTURE_OUTPUT_DIR'], exist_ok=True)
+    output = os.path.join(app.config['CAPTURE_OUTPUT_DIR'], name)
+    with app.app_context():
+        data = Data(title=name, filepath=output, satellite=scheduled.satname)
+        db.session.add(data)
+        db.session.commit()
+        data_id = data.id
+    job, _ = jobs.submit('capture', capture_process, device='rtlsdr', dedupe=False,
+                         timeout=duration + app.config['CAPTURE_JOB_GRACE'],
+                         mode=profile['mode'], pipeline=profile.get('pipeline'), output=output,
+                         frequency=profile['frequency'], samplerate=profile['samplerate'],
+                         gain=profile.get('gain', 30), los=scheduled.los)
+    return {'job_id': job.id, 'data_id': data_id}
+
+scheduler = CaptureScheduler(start_scheduled_capture,
+                             dry_run=app.config['CAPTURE_DRY_RUN'],
+                             lead=app.config['CAPTURE_LEAD_SECONDS'],
+                             gap=app.config['CAPTURE_RETUNE_GAP'])
+scheduler.start()
+
+def submit_job(kind, target, device=None):
+    # Queue a SatDump job; an identical job still queued or running is reused instead of duplicated
+    job, created = jobs.submit(kind, target, device=device, timeout=app.config['JOB_TIMEOUT'])
+    message = f'{kind} job {job.id} queued' if created else f'{kind} job {job.id} already {job.state}'
+    return jsonify({'success': True, 'message': message, 'job': job.to_dict()}), 202 if created else 200
 
 @app.route('/')
 def hello_world():
@@ -39,30 +95,81 @@ def add_data():
     db.session.commit()
     return jsonify({'message': 'Data added successfully'})
 
+@app.route('/data/<int:id>/positions', methods=['POST'])
+def add_positions(id):
+    # Accepts a list of samples or a dict of equal-length columns keyed by field name
+    try:
+        data = Data.query.get(id)
+        if data is None:
+            return jsonify({'success': False, 'error': 'Data not found'}), 404
+        samples = request.get_json()['positions']
+        written = bulk_insert_positions(data.id, samples, title=data.title)
+        return jsonify({'success': True, 'written': written})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/data/<int:id>/positions', methods=['GET'])
+def get_positions(id):
+    # Query params: start/end (ISO 8601 or unix seconds), cursor, limit,
+    # every=N or bucket=seconds (&field=elevation) for downsampling, format=json|ndjson
+    try:
+        if Data.query.get(id) is None:
+            return jsonify({'success': False, 'error': 'Data not found'}), 404
+        args = request.args
+        limit = min(args.get('limit', position_history.DEFAULT_LIMIT, type=int), position_history.MAX_LIMIT)
+        try:
+            rows = position_history.iter_positions(id, args.get('start'), args.get('end'), args.get('cursor'))
+        except ValueError as e:
+            # Malformed start/end/cursor (binascii.Error and UnicodeDecodeError are ValueErrors too)
+            return jsonify({'success': False, 'error': f'Invalid start, end or cursor: {e}'}), 400
+        if args.get('bucket', type=float):
+            field = args.get('field', 'elevation')
+            if field not in position_history.POSITION_FIELDS:
+                return jsonify({'success': False, 'error': f'Unknown field {field}'}), 400
+            samples = position_history.min_max_buckets(rows, args.get('bucket', type=float), field)
+        elif args.get('every', 1, type=int) > 1:
+            samples = position_history.every_nth(rows, args.get('every', type=int))
+        else:
+            samples = ((row, row) for row in rows)
+        rows, state = position_history.paginate(samples, max(limit, 1))
+
+        if args.get('format') == 'ndjson':
+            body = position_history.stream_ndjson(id, rows, state)
+            mimetype = 'application/x-ndjson'
+        else:
+            body = position_history.stream_json(id, rows, state)
+            mimetype = 'application/json'
+        return Response(stream_with_context(body), mimetype=mimetype)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # New endpoints for calling Python functions
 
 @app.route('/satellite/start-recording', methods=['POST'])
 def start_recording():
     try:
-        # Run in background thread to avoid blocking
-        thread = threading.Thread(target=record_process)
-        thread.daemon = True
-        thread.start()
-        return jsonify({'success': True, 'message': 'Recording started in background'})
+        # The SDR can only serve one job at a time, so recordings share the rtlsdr device
+        return submit_job('record', record_process, device='rtlsdr')
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/satellite/process-offline', methods=['POST'])
 def process_offline():
     try:
-        # Run in background thread to avoid blocking
-        thread = threading.Thread(target=offline_process)
-        thread.daemon = True
-        thread.start()
-        return jsonify({'success': True, 'message': 'Offline processing started in background'})
+        return submit_job('offline', offline_process)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
         
+def prediction_too_large(satellites, observers, days):
+    # Error message when a local prediction request is past the configured bounds, else None
+    if not 0 < days <= app.config['PREDICT_MAX_DAYS']:
+        return f"days must be between 0 and {app.config['PREDICT_MAX_DAYS']}"
+    if len(satellites) > app.config['PREDICT_MAX_SATELLITES']:
+        return f"At most {app.config['PREDICT_MAX_SATELLITES']} satellites per request"
+    if len(observers) > app.config['PREDICT_MAX_OBSERVERS']:
+        return f"At most {app.config['PREDICT_MAX_OBSERVERS']} observers per request"
+    return None
+
 @app.route('/satellite/visual-passes', methods=['POST'])
 def get_visual_passes():
     try:
@@ -75,10 +182,77 @@ def get_visual_passes():
         days = data.get('days', 2)
         min_visibility = data.get('min_visibility', 300)
         api_key = data.get('api_key', '')
-        
+        # 'local' uses stored TLEs, 'n2yo' always calls the API, 'auto' prefers local when a
+        # TLE is stored and no older than TLE_MAX_AGE_DAYS
+        source = data.get('source', 'auto')
+
+        satellites = load_satellites([sat_id]) if source != 'n2yo' else None
+        tle = tle_info(satellites[0]) if satellites else None
+        if tle is not None and (source == 'local' or tle['age_days'] <= app.config['TLE_MAX_AGE_DAYS']):
+            observer = Observer(float(observer_lat), float(observer_lng), float(observer_alt))
+            error = prediction_too_large(satellites, [observer], float(days))
+            if error:
+                return jsonify({'success': False, 'error': error}), 400
+            result = predict_passes(satellites, [observer], days=float(days),
+                                    min_visibility=float(min_visibility), visual=True)[0][0]
+            return jsonify({'success': True, 'source': 'local', 'data': result, 'tle': tle})
+        if source == 'local':
+            return jsonify({'success': False, 'error': f'No TLE stored for satellite {sat_id}'}), 404
+
         # Call your Python function
         result = fetch_visualPasses(sat_id, observer_lat, observer_lng, observer_alt, days, min_visibility, api_key)
-        return jsonify({'success': True, 'data': result})
+        # tle is the stale local set that was passed over, if any
+        return jsonify({'success': True, 'source': 'n2yo', 'data': result, 'tle': tle})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/satellite/n2yo-stats', methods=['GET'])
+def get_n2yo_stats():
+    return jsonify(cache_stats())
+
+@app.route('/satellite/passes', methods=['POST'])
+def get_passes_batch():
+    # Local prediction for many satellites and observers in one call
+    try:
+        data = request.get_json()
+        sat_ids = data.get('ids', [25544])
+        observers = [Observer(float(o.get('lat')), float(o.get('lng')), float(o.get('alt', 0)))
+                     for o in data.get('observers', [{'lat': 41.702, 'lng': -76.014, 'alt': 0}])]
+        days = float(data.get('days', 2))
+        error = prediction_too_large(sat_ids, observers, days)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        satellites = load_satellites(sat_ids)
+        if satellites is None:
+            return jsonify({'success': False, 'error': 'Missing TLE for one or more satellites'}), 404
+
+        results = predict_passes(satellites, observers,
+                                 days=days,
+                                 min_visibility=float(data.get('min_visibility', 0)),
+                                 min_elevation=float(data.get('min_elevation', 0)),
+                                 visual=bool(data.get('visual', False)))
+        return jsonify({'success': True, 'data': [
+            {'observer': observer._asdict(), 'satellites': [results[s][o] for s in range(len(satellites))]}
+            for o, observer in enumerate(observers)
+        ], 'tles': [tle_info(satellite) for satellite in satellites]})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/satellite/tle', methods=['POST'])
+def add_tles():
+    # Store TLE sets either from raw text or by pulling them once from N2YO
+    try:
+        data = request.get_json()
+        if 'tle' in data:
+            stored = store_tles(data['tle'])
+        else:
+            api_key = data.get('api_key', '')
+            text = ''
+            for sat_id in data.get('ids', []):
+                tle = fetch_tle(sat_id, api_key)
+                text += f"{tle['info']['satname']}\n{tle['tle']}\n"
+            stored = store_tles(text)
+        return jsonify({'success': True, 'stored': stored})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -86,15 +260,257 @@ def get_visual_passes():
 @app.route('/satellite/start-live', methods=['POST'])
 def start_live_tracking():
     try:
-        # Run in background thread so it doesn't block the API
-        thread = threading.Thread(target=live_process)
-        thread.daemon = True
-        thread.start()
-        
-        return jsonify({'success': True, 'message': 'Live tracking started in background'})
+        return submit_job('live', live_process, device='rtlsdr')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    state = request.args.get('state')
+    return jsonify({'success': True, 'queue_depth': jobs.queue_depth(),
+                    'jobs': [job.to_dict() for job in jobs.list(state)]})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict(), 'log': list(job.log_tail)})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/scheduler', methods=['GET'])
+def get_schedule():
+    return jsonify({'success': True, 'dry_run': scheduler.dry_run,
+                    'upcoming': [p.to_dict() for p in scheduler.upcoming()],
+                    'history': [p.to_dict() for p in scheduler.history]})
+
+@app.route('/scheduler/passes', methods=['POST'])
+def schedule_passes():
+    # Either N2YO-shaped responses in 'passes', or satellite 'ids' plus an 'observer' to predict locally
+    try:
+        data = request.get_json()
+        tles = []
+        if 'passes' in data:
+            responses = data['passes']
+        else:
+            sat_ids = data.get('ids', list(scheduler.profiles))
+            o = data.get('observer', {'lat': 41.702, 'lng': -76.014, 'alt': 0})
+            observer = Observer(float(o['lat']), float(o['lng']), float(o.get('alt', 0)))
+            days = float(data.get('days', 1))
+            error = prediction_too_large(sat_ids, [observer], days)
+            if error:
+                return jsonify({'success': False, 'error': error}), 400
+            satellites = load_satellites(sat_ids)
+            if satellites is None:
+                return jsonify({'success': False, 'error': 'Missing TLE for one or more satellites'}), 404
+            results = predict_passes(satellites, [observer], days=days)
+            responses = [row[0] for row in results]
+            tles = [tle_info(satellite) for satellite in satellites]
+        accepted, rejected = scheduler.add_passes(responses)
+        return jsonify({'success': True,
+                        'accepted': [p.to_dict() for p in accepted],
+                        'rejected': [p.to_dict() for p in rejected],
+                        'tles': tles})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/scheduler/passes/<pass_id>/cancel', methods=['POST'])
+def cancel_scheduled_pass(pass_id):
+    scheduled = scheduler.cancel(pass_id)
+    if scheduled is None:
+        return jsonify({'success': False, 'error': 'Pass not found'}), 404
+    return jsonify({'success': True, 'pass': scheduled.to_dict()})
+
+@app.route('/scheduler/simulate', methods=['POST'])
+def simulate_schedule():
+    # Dry-run only: fire everything scheduled before 'until' (unix seconds) on a virtual clock
+    if not scheduler.dry_run:
+        return jsonify({'success': False, 'error': 'Scheduler is not in dry-run mode'}), 400
+    until = float(request.get_json().get('until', 0))
+    return jsonify({'success': True, 'fired': [p.to_dict() for p in scheduler.simulate(until)]})
+
+tracking_loop = None
+
+def make_rotator(name, limits):
+    if name == 'rotctld':
+        return tracking.RotctldBackend(app.config['ROTCTLD_HOST'], app.config['ROTCTLD_PORT'])
+    if name == 'serial':
+        return tracking.SerialBackend(app.config['ROTATOR_SERIAL_PORT'])
+    if name == 'simulator':
+        return tracking.SimulatorBackend(limits)
+    raise ValueError(f'Unknown rotator backend {name}')
+
+@app.route('/tracking/start', methods=['POST'])
+def start_antenna_tracking():
+    # Track either a stored capture ('data_id', replayed from now if it is in the past)
+    # or the next pass of 'satid' over 'observer' predicted from the stored TLE
+    global tracking_loop
+    try:
+        data = request.get_json()
+        limits = tracking.RotatorLimits(**app.config['ROTATOR_LIMITS'])
+        time_offset = 0.0
+        if 'data_id' in data:
+            rows = list(position_history.iter_positions(int(data['data_id'])))
+            if len(rows) < 2:
+                return jsonify({'success': False, 'error': 'Not enough positions for that capture'}), 404
+            times = np.array([(row.timestamp - position_history.EPOCH).total_seconds() for row in rows])
+            az = np.array([row.azimuth for row in rows])
+            el = np.array([row.elevation for row in rows])
+            if times[-1] < time.time():
+                time_offset = time.time() - times[0]
+        else:
+            satellites = load_satellites([data.get('satid', 25544)])
+            if satellites is None:
+                return jsonify({'success': False, 'error': 'No TLE stored for that satellite'}), 404
+            o = data.get('observer', {'lat': 41.702, 'lng': -76.014, 'alt': 0})
+            observer = Observer(float(o['lat']), float(o['lng']), float(o.get('alt', 0)))
+            passes = predict_passes(satellites, [observer], start=time.time() - 3600, days=1)[0][0]['passes']
+            upcoming = [p for p in passes if p['endUTC'] > time.time()]
+            if not upcoming:
+                return jsonify({'success': False, 'error': 'No pass in the next day'}), 404
+            times = np.arange(upcoming[0]['startUTC'], upcoming[0]['endUTC'] + 1, 1.0)
+            az, el = look_track(satellites[0], observer, times)
+
+        trajectory = tracking.Trajectory(times, az, el, limits, rate=float(data.get('rate', app.config['TRACKING_RATE'])))
+        backend = make_rotator(data.get('backend', app.config['ROTATOR_BACKEND']), limits)
+        if tracking_loop is not None:
+            tracking_loop.stop()
+        tracking_loop = tracking.TrackingLoop(trajectory, backend, time_offset=time_offset)
+        tracking_loop.start()
+        return jsonify({'success': True, 'message': 'Antenna tracking started', 'tracking': tracking_loop.status()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/tracking/stop', methods=['POST'])
+def stop_antenna_tracking():
+    if tracking_loop is None:
+        return jsonify({'success': False, 'error': 'Not tracking'}), 404
+    tracking_loop.stop()
+    return jsonify({'success': True, 'tracking': tracking_loop.status()})
+
+@app.route('/tracking/status', methods=['GET'])
+def get_tracking_status():
+    if tracking_loop is None:
+        return jsonify({'success': True, 'tracking': None})
+    return jsonify({'success': True, 'tracking': tracking_loop.status()})
+
+images = ImageService(app.config['IMAGE_ROOT'], app.config['IMAGE_CACHE_DIR'],
+                      app.config['IMAGE_CACHE_MAX_BYTES'],
+                      thumbnail_size=app.config['THUMBNAIL_SIZE'], tile_size=app.config['TILE_SIZE'])
+# Originals and derived images never change under the same ETag, so browsers may keep them a day
+IMAGE_MAX_AGE = 86400
+
+@app.route('/api/images', methods=['GET'])
+def list_images():
+    satellite = request.args.get('satellite')
+    # describe() reads row.data, so load it from the join instead of one query per image
+    query = ImageFile.query.join(Data).options(contains_eager(ImageFile.data)).order_by(Data.date.desc())
+    if satellite:
+        query = query.filter(Data.satellite.ilike(f'%{satellite}%'))
+    return jsonify({'success': True, 'images': [images.describe(row) for row in query.all()]})
+
+@app.route('/api/images/scan', methods=['POST'])
+def scan_images():
+    try:
+        return jsonify({'success': True, **images.scan()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/images/<int:id>/thumbnail', methods=['GET'])
+def get_image_thumbnail(id):
+    row = ImageFile.query.get(id)
+    if row is None:
+        return jsonify({'success': False, 'error': 'Image not found'}), 404
+    return send_file(images.thumbnail(row), mimetype='image/jpeg', conditional=True,
+                     etag=etag_for(row, '-thumb'), max_age=IMAGE_MAX_AGE)
+
+@app.route('/api/images/<int:id>/tiles/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def get_image_tile(id, z, x, y):
+    row = ImageFile.query.get(id)
+    path = images.tile(row, z, x, y) if row is not None else None
+    if path is None:
+        return jsonify({'success': False, 'error': 'Tile not found'}), 404
+    return send_file(path, mimetype='image/png', conditional=True,
+                     etag=etag_for(row, f'-{z}-{x}-{y}'), max_age=IMAGE_MAX_AGE)
+
+@app.route('/api/images/<path:name>', methods=['GET'])
+def get_image(name):
+    # Full resolution product; send_file handles Range and If-None-Match for us
+    row = images.resolve(name)
+    if row is None:
+        return jsonify({'success': False, 'error': 'Image not found'}), 404
+    return send_file(row.path, conditional=True, etag=etag_for(row), max_age=IMAGE_MAX_AGE)
+
+def baseband_preview_job(job, data_id, **options):
+    # Runs on a job worker, outside any request
+    with app.app_context():
+        data = Data.query.get(data_id)
+        baseband.build_preview(data, app.config['BASEBAND_PREVIEW_DIR'], job=job, **options)
+
+@app.route('/data/<int:id>/baseband/preview', methods=['POST'])
+def start_baseband_preview(id):
+    data = Data.query.get(id)
+    if data is None:
+        return jsonify({'success': False, 'error': 'Data not found'}), 404
+    if baseband.find_recording(data.filepath) is None:
+        return jsonify({'success': False, 'error': 'No baseband recording for this capture'}), 404
+    body = request.get_json(silent=True) or {}
+    options = {name: body[name] for name in ('fmt', 'samplerate', 'frequency', 'fft_size', 'rows') if body.get(name)}
+    job, created = jobs.submit('baseband_preview', baseband_preview_job, timeout=app.config['JOB_TIMEOUT'],
+                               data_id=id, **options)
+    return jsonify({'success': True, 'job': job.to_dict()}), 202 if created else 200
+
+@app.route('/data/<int:id>/baseband/preview', methods=['GET'])
+def get_baseband_preview(id):
+    data = Data.query.get(id)
+    row = data.baseband_preview if data is not None else None
+    if row is None:
+        return jsonify({'success': False, 'error': 'No preview yet, POST to this URL to build one'}), 404
+    try:
+        preview = baseband.load_preview(row)
+        return jsonify({'success': True, 'data_id': id, 'format': row.format, 'source': row.source,
+                        'waterfall': f'/data/{id}/baseband/waterfall.png', **baseband.summary(preview)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/data/<int:id>/baseband/waterfall.png', methods=['GET'])
+def get_baseband_waterfall(id):
+    data = Data.query.get(id)
+    row = data.baseband_preview if data is not None else None
+    if row is None:
+        return jsonify({'success': False, 'error': 'No preview yet'}), 404
+    return send_file(baseband.waterfall_path(row.path), mimetype='image/png', conditional=True,
+                     etag=baseband.preview_etag(row), max_age=IMAGE_MAX_AGE)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/slow-requests', methods=['GET'])
+def get_slow_requests():
+    if profiler is None:
+        return jsonify({'success': False, 'error': 'Profiling is off, set PROFILE_SLOW_REQUEST_MS'}), 404
+    return jsonify({'success': True, 'threshold_ms': app.config['PROFILE_SLOW_REQUEST_MS'],
+                    'requests': list(profiler.recent)})
+
+@app.route('/events', methods=['GET'])
+def stream_events():
+    # Server-Sent Events: a 'status' snapshot first, then 'job', 'progress' and 'log' events
+    job_id = request.args.get('job')
+    active = [job.to_dict() for job in jobs.list() if job.state in (QUEUED, RUNNING)]
+    if job_id is not None:
+        active = [job for job in active if job['id'] == job_id]
+    initial = [('status', {'jobs': active, 'queue_depth': jobs.queue_depth()})]
+    return Response(stream_with_context(stream_sse(events, initial, job_id)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     app.run(debug=True)
 
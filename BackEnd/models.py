@@ -21,6 +21,9 @@ class Data(db.Model):
     
 
 class Positions(db.Model):
+    # Position history is always read per capture in time order
+    __table_args__ = (db.Index('ix_positions_data_id_timestamp', 'data_id', 'timestamp'),)
+
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     data_id = db.Column(db.Integer, db.ForeignKey('data.id'), nullable=False)
     title = db.Column(db.String(100), nullable=False)
@@ -31,4 +34,44 @@ class Positions(db.Model):
     elevation = db.Column(db.Float, nullable=False)
     ra = db.Column(db.Float, nullable=False)
     dec = db.Column(db.Float, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TLE(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    satid = db.Column(db.Integer, unique=True, nullable=False)
+    satname = db.Column(db.String(100), nullable=False)
+    line1 = db.Column(db.String(80), nullable=False)
+    line2 = db.Column(db.String(80), nullable=False)
+    epoch = db.Column(db.DateTime, nullable=False)
+    updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ImageFile(db.Model):
+    # Fingerprint of an indexed SatDump product, so rescans only touch new or changed files
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    data_id = db.Column(db.Integer, db.ForeignKey('data.id'), nullable=False)
+    path = db.Column(db.String(400), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    mtime_ns = db.Column(db.Integer, nullable=False)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+
+    data = db.relationship('Data', backref=db.backref('image', uselist=False))
+
+
+class BasebandPreview(db.Model):
+    # Quick-look waterfall/power summary of a baseband recording, stored as an .npz next to the Data row
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    data_id = db.Column(db.Integer, db.ForeignKey('data.id'), unique=True, nullable=False)
+    path = db.Column(db.String(400), nullable=False)
+    source = db.Column(db.String(400), nullable=False)
+    source_size = db.Column(db.Integer, nullable=False)
+    source_mtime_ns = db.Column(db.Integer, nullable=False)
+    options = db.Column(db.String(200), nullable=False, default='{}')  # JSON of the options it was built with
+    format = db.Column(db.String(8), nullable=False)
+    samplerate = db.Column(db.Float, nullable=False)
+    frequency = db.Column(db.Float)
+    samples = db.Column(db.Integer, nullable=False)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+
+    data = db.relationship('Data', backref=db.backref('baseband_preview', uselist=False))
@@ -0,0 +1,305 @@
+'''Memory-mapped reader and quick-look preview for SatDump baseband recordings'''
+'''A recording is mapped rather than read, and walked in fixed-size chunks, so a multi-GB
+capture is summarised in one pass with memory bounded by the chunk size. The preview is
+a time-decimated FFT waterfall plus total power over time, saved as a small .npz'''
+
+import json
+import mmap
+import os
+import re
+import struct
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from database import db
+from models import BasebandPreview
+
+# format -> (dtype of one I or Q value, full scale); w16 is int16 I/Q inside a WAV file
+FORMATS = {
+    'w16': (np.int16, 32768.0),
+    'cs16': (np.int16, 32768.0),
+    'cf32': (np.float32, 1.0),
+}
+EXTENSIONS = {'.wav': 'w16', '.w16': 'w16', '.cs16': 'cs16', '.cf32': 'cf32'}
+CHUNK_SAMPLES = 1 << 20
+FFT_SIZE = 1024
+ROWS = 512
+AVERAGES = 16
+POWER_PER_ROW = 8
+
+
+def parse_wav(f):
+    """Offset, byte length, sample rate and channel count of the data chunk of a WAV file
+
+    SatDump cannot fill in the RIFF sizes of a recording that was killed, so a data
+    chunk with a zero or oversized length is taken to run to the end of the file."""
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        raise ValueError('not a WAV file')
+    file_size = os.fstat(f.fileno()).st_size
+    samplerate = channels = bits = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError('WAV file has no data chunk')
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk)
+        if chunk_id == b'fmt ':
+            fmt = f.read(chunk_size)
+            _, channels, samplerate, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+        elif chunk_id == b'data':
+            offset = f.tell()
+            if chunk_size == 0 or offset + chunk_size > file_size:
+                chunk_size = file_size - offset
+            if channels != 2 or bits != 16:
+                raise ValueError(f'expected 16-bit stereo I/Q, got {channels} channels of {bits} bits')
+            return offset, chunk_size, samplerate, channels
+        else:
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+def guess_format(path):
+    fmt = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f'unknown baseband format for {os.path.basename(path)}')
+    return fmt
+
+
+def guess_tuning(path):
+    """(samplerate, frequency) from a SatDump style name such as ..._2000000SPS_137100000Hz.cs16"""
+    name = os.path.basename(path)
+    samplerate = re.search(r'(\d+(?:\.\d+)?)SPS', name, re.IGNORECASE)
+    frequency = re.search(r'(\d+(?:\.\d+)?)Hz', name, re.IGNORECASE)
+    return (float(samplerate.group(1)) if samplerate else None,
+            float(frequency.group(1)) if frequency else None)
+
+
+def find_recording(filepath):
+    """The baseband file for a Data row; SatDump adds the extension to the output name it is given"""
+    if os.path.isfile(filepath):
+        return filepath
+    for extension in EXTENSIONS:
+        if os.path.isfile(filepath + extension):
+            return filepath + extension
+    return None
+
+
+class BasebandFile:
+    """Read-only memory map of interleaved I/Q samples"""
+
+    def __init__(self, path, fmt=None, samplerate=None, frequency=None):
+        self.path = path
+        self.format = fmt or guess_format(path)
+        if self.format not in FORMATS:
+            raise ValueError(f'unsupported baseband format {self.format}')
+        dtype, self.full_scale = FORMATS[self.format]
+        name_samplerate, name_frequency = guess_tuning(path)
+        offset, length = 0, os.path.getsize(path)
+        wav_samplerate = None
+        if self.format == 'w16':
+            with open(path, 'rb') as f:
+                offset, length, wav_samplerate, _ = parse_wav(f)
+        self.samplerate = samplerate or wav_samplerate or name_samplerate
+        self.frequency = frequency or name_frequency
+        if not self.samplerate:
+            raise ValueError('sample rate unknown, pass samplerate')
+
+        self.item = np.dtype(dtype).itemsize * 2
+        self.samples = length // self.item
+        # One row per complex sample; a trailing partial sample is dropped
+        self.raw = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(self.samples, 2)) \
+            if self.samples else np.zeros((0, 2), dtype=dtype)
+        # np.memmap maps from the allocation boundary below offset
+        self.map = getattr(self.raw, '_mmap', None)
+        self.map_offset = offset % mmap.ALLOCATIONGRANULARITY
+        self.released = 0
+        if self.map is not None and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+
+    @property
+    def duration(self):
+        return self.samples / self.samplerate
+
+    def chunks(self, start=0, stop=None, chunk_samples=CHUNK_SAMPLES):
+        """Zero-copy (start, view) slices of the raw samples, chunk_samples at a time"""
+        stop = self.samples if stop is None else min(stop, self.samples)
+        for i in range(start, stop, chunk_samples):
+            yield i, self.raw[i:min(i + chunk_samples, stop)]
+
+    def release(self, stop):
+        """Drop mapped pages before sample stop from this process; they stay in the page cache
+
+        Without this, every page read stays resident in our RSS until the map is closed,
+        so a full pass over a 3 GB recording would look like a 3 GB process."""
+        if self.map is None or not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+        end = (self.map_offset + stop * self.item) // mmap.PAGESIZE * mmap.PAGESIZE
+        if end > self.released:
+            self.map.madvise(mmap.MADV_DONTNEED, self.released, end - self.released)
+            self.released = end
+
+    def power(self, raw):
+        """Mean |x|^2 of a raw chunk, in full-scale units"""
+        values = raw.reshape(-1).astype(np.float32)
+        return float(np.dot(values, values)) / (len(raw) * self.full_scale ** 2)
+
+    def complex(self, raw):
+        values = raw.astype(np.float32)
+        if self.full_scale != 1.0:
+            values *= 1.0 / self.full_scale
+        return values.view(np.complex64).reshape(-1)
+
+
+def compute_preview(baseband, fft_size=FFT_SIZE, rows=ROWS, averages=AVERAGES,
+                    power_per_row=POWER_PER_ROW, chunk_samples=CHUNK_SAMPLES, progress=None):
+    """Waterfall and power over time in one pass over the file
+
+    The recording is split into rows time slices. Each waterfall row averages
+    averages windowed FFTs spread evenly over its slice, and every sample of the
+    slice is counted in power_per_row total power points. Returns a dict of arrays."""
+    if baseband.samples < fft_size:
+        raise ValueError(f'recording has fewer than {fft_size} samples')
+    rows = max(1, min(rows, baseband.samples // fft_size))
+    span = baseband.samples // rows
+    segment = max(1, span // power_per_row)
+    window = np.hanning(fft_size).astype(np.float32)
+    window_power = float(np.sum(window ** 2))
+
+    waterfall = np.empty((rows, fft_size), dtype=np.float32)
+    power = np.empty(rows * power_per_row, dtype=np.float32)
+    for row in range(rows):
+        row_start = row * span
+        row_stop = baseband.samples if row == rows - 1 else row_start + span
+
+        for k in range(power_per_row):
+            seg_start = row_start + k * segment
+            seg_stop = row_stop if k == power_per_row - 1 else seg_start + segment
+            total = 0.0
+            for _, raw in baseband.chunks(seg_start, seg_stop, chunk_samples):
+                total += baseband.power(raw) * len(raw)
+            power[row * power_per_row + k] = total / max(1, seg_stop - seg_start)
+
+        starts = np.linspace(row_start, row_stop - fft_size, min(averages, max(1, (row_stop - row_start) // fft_size)))
+        frames = np.stack([baseband.complex(baseband.raw[s:s + fft_size]) for s in starts.astype(np.int64)])
+        spectrum = np.fft.fft(frames * window, axis=1)
+        psd = np.mean(spectrum.real ** 2 + spectrum.imag ** 2, axis=0) / window_power
+        waterfall[row] = np.fft.fftshift(psd)
+        baseband.release(row_stop)
+        if progress is not None:
+            progress(row + 1, rows)
+
+    tiny = np.float32(1e-20)
+    freqs = np.fft.fftshift(np.fft.fftfreq(fft_size, 1.0 / baseband.samplerate)) + (baseband.frequency or 0.0)
+    return {
+        'waterfall': 10 * np.log10(waterfall + tiny),
+        'power': 10 * np.log10(power + tiny),
+        'power_times': (np.arange(len(power)) * segment + segment / 2) / baseband.samplerate,
+        'row_times': (np.arange(rows) * span + span / 2) / baseband.samplerate,
+        'freqs': freqs,
+        'samplerate': baseband.samplerate,
+        'frequency': baseband.frequency or 0.0,
+        'samples': baseband.samples,
+    }
+
+
+def summary(preview):
+    """JSON-friendly view of a preview: power curve and the mean spectrum, not the full waterfall"""
+    waterfall = preview['waterfall']
+    return {
+        'samplerate': float(preview['samplerate']),
+        'frequency': float(preview['frequency']),
+        'samples': int(preview['samples']),
+        'duration': float(preview['samples'] / preview['samplerate']),
+        'rows': int(waterfall.shape[0]),
+        'fft_size': int(waterfall.shape[1]),
+        'freqs': preview['freqs'].round(1).tolist(),
+        'mean_spectrum': waterfall.mean(axis=0).round(2).tolist(),
+        'peak_spectrum': waterfall.max(axis=0).round(2).tolist(),
+        'power_times': preview['power_times'].round(4).tolist(),
+        'power': preview['power'].round(2).tolist(),
+    }
+
+
+def waterfall_png(preview, path, low=None, high=None):
+    """Render the waterfall to a PNG, time downwards, scaled between low and high dB"""
+    from PIL import Image
+
+    waterfall = preview['waterfall']
+    low = np.percentile(waterfall, 5) if low is None else low
+    high = waterfall.max() if high is None else high
+    scaled = np.clip((waterfall - low) / max(high - low, 1e-6), 0, 1)
+    # Black -> blue -> yellow -> white, close enough to SatDump's own palette
+    stops = np.array([[0, 0, 0], [0, 0, 160], [230, 220, 0], [255, 255, 255]], dtype=np.float32)
+    position = scaled * (len(stops) - 1)
+    index = np.minimum(position.astype(np.int64), len(stops) - 2)
+    fraction = (position - index)[..., None]
+    rgb = stops[index] * (1 - fraction) + stops[index + 1] * fraction
+    Image.fromarray(rgb.astype(np.uint8), 'RGB').save(path)
+    return path
+
+
+def make_progress(job):
+    """compute_preview progress callback reporting percent done to a job every 16 rows"""
+    def progress(done, total):
+        if done == total or done % 16 == 0:
+            job.report_progress({'percent': round(100.0 * done / total, 1)})
+    return progress
+
+
+def build_preview(data, preview_dir, fmt=None, samplerate=None, frequency=None, job=None, **options):
+    """Compute and store the preview for a Data row's recording; returns the BasebandPreview row
+
+    A stored preview is reused while the recording's size and mtime and the requested
+    options are unchanged."""
+    path = find_recording(data.filepath)
+    if path is None:
+        raise FileNotFoundError(f'no baseband recording at {data.filepath}')
+    stat = os.stat(path)
+    requested = dict(options, fmt=fmt, samplerate=samplerate, frequency=frequency)
+    settings = json.dumps({name: value for name, value in requested.items() if value is not None}, sort_keys=True)
+    row = data.baseband_preview
+    if row is not None and row.source_size == stat.st_size and row.source_mtime_ns == stat.st_mtime_ns \
+            and row.options == settings and os.path.isfile(row.path):
+        return row
+
+    baseband = BasebandFile(path, fmt, samplerate, frequency)
+    progress = make_progress(job) if job is not None else None
+    preview = compute_preview(baseband, progress=progress, **options)
+
+    os.makedirs(preview_dir, exist_ok=True)
+    npz_path = os.path.join(preview_dir, f'{data.id}.npz')
+    tmp = npz_path + '.tmp.npz'
+    np.savez_compressed(tmp, **preview)
+    os.replace(tmp, npz_path)
+    waterfall_png(preview, waterfall_path(npz_path))
+
+    if row is None:
+        row = BasebandPreview(data=data)
+        db.session.add(row)
+    row.path = npz_path
+    row.source = path
+    row.source_size = stat.st_size
+    row.source_mtime_ns = stat.st_mtime_ns
+    row.options = settings
+    row.format = baseband.format
+    row.samplerate = baseband.samplerate
+    row.frequency = baseband.frequency
+    row.samples = baseband.samples
+    row.created = datetime.utcnow()
+    db.session.commit()
+    return row
+
+
+def preview_etag(row):
+    """Changes with the recording and with the options the preview was built with"""
+    return f'{row.source_size:x}-{row.source_mtime_ns:x}-{zlib.crc32(row.options.encode()):x}'
+
+
+def waterfall_path(npz_path):
+    return os.path.splitext(npz_path)[0] + '.png'
+
+
+def load_preview(row):
+    with np.load(row.path) as npz:
+        return {name: npz[name] for name in npz.files}
@@ -0,0 +1,264 @@
+'''Pass-driven capture scheduler'''
+'''Takes predicted passes (N2YO-shaped: startUTC/endUTC/maxEl), keeps only the ones
+the single SDR can actually take, and starts a SatDump capture at each AOS that
+runs until LOS. Upcoming captures sit in a heap keyed on start time, so one timer
+thread serves hundreds of passes'''
+
+import heapq
+import threading
+import time
+from collections import deque
+
+SCHEDULED = 'scheduled'
+STARTED = 'started'
+SKIPPED = 'skipped'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+DRY_RUN = 'dry-run'
+
+# Per-satellite capture settings, keyed by NORAD id. Higher priority wins overlapping passes
+SATELLITE_PROFILES = {
+    25338: {'name': 'NOAA-15', 'mode': 'live', 'pipeline': 'noaa_apt', 'frequency': 137.62e6,
+            'samplerate': 1.024e6, 'gain': 30, 'min_elevation': 15, 'priority': 1},
+    28654: {'name': 'NOAA-18', 'mode': 'live', 'pipeline': 'noaa_apt', 'frequency': 137.9125e6,
+            'samplerate': 1.024e6, 'gain': 30, 'min_elevation': 15, 'priority': 1},
+    33591: {'name': 'NOAA-19', 'mode': 'live', 'pipeline': 'noaa_apt', 'frequency': 137.1e6,
+            'samplerate': 1.024e6, 'gain': 30, 'min_elevation': 15, 'priority': 1},
+    57166: {'name': 'METEOR-M2-3', 'mode': 'live', 'pipeline': 'meteor_m2-x_lrpt', 'frequency': 137.9e6,
+            'samplerate': 1.024e6, 'gain': 30, 'min_elevation': 20, 'priority': 2},
+    40069: {'name': 'METEOR-M2', 'mode': 'record', 'pipeline': 'meteor_hrpt', 'frequency': 1700e6,
+            'samplerate': 3e6, 'gain': 40, 'min_elevation': 25, 'priority': 3},
+    25544: {'name': 'ISS', 'mode': 'record', 'pipeline': None, 'frequency': 145.8e6,
+            'samplerate': 1.024e6, 'gain': 30, 'min_elevation': 20, 'priority': 0},
+}
+
+
+class ScheduledPass:
+    def __init__(self, satid, satname, aos, los, max_el, profile):
+        self.id = f'{satid}-{int(aos)}'
+        self.satid = satid
+        self.satname = satname
+        self.aos = float(aos)
+        self.los = float(los)
+        self.max_el = float(max_el)
+        self.profile = profile
+        self.priority = profile.get('priority', 0)
+        self.state = SCHEDULED
+        self.reason = None
+        self.fired_at = None
+        self.capture = None  # whatever start_capture returned (job id, data id)
+        self.seq = None  # heap entry that fires this pass; older entries for the same id are stale
+
+    def overlaps(self, other, gap=0.0):
+        return self.aos < other.los + gap and other.aos < self.los + gap
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'satid': self.satid,
+            'satname': self.satname,
+            'startUTC': int(self.aos),
+            'endUTC': int(self.los),
+            'maxEl': self.max_el,
+            'duration': int(self.los - self.aos),
+            'priority': self.priority,
+            'mode': self.profile.get('mode'),
+            'frequency': self.profile.get('frequency'),
+            'state': self.state,
+            'reason': self.reason,
+            'fired_at': self.fired_at,
+            'capture': self.capture,
+        }
+
+
+def passes_from_responses(responses, profiles, now):
+    """ScheduledPass candidates from N2YO-shaped responses, for satellites that have a profile"""
+    candidates = []
+    for response in responses:
+        satid = int(response['info']['satid'])
+        profile = profiles.get(satid)
+        if profile is None:
+            continue
+        satname = response['info'].get('satname') or profile.get('name', str(satid))
+        for p in response.get('passes', []):
+            if p['endUTC'] <= now or p['maxEl'] < profile.get('min_elevation', 0):
+                continue
+            candidates.append(ScheduledPass(satid, satname, p['startUTC'], p['endUTC'], p['maxEl'], profile))
+    return candidates
+
+
+def resolve_conflicts(fixed, candidates, gap=0.0):
+    """Greedy priority policy for one receiver
+
+    Passes already fixed (started) are kept. Candidates are taken in order of
+    priority, then higher max elevation, then earlier AOS, and accepted when they
+    do not overlap anything accepted so far (with gap seconds to retune).
+    Returns (accepted, rejected) with the reason set on rejected passes."""
+    accepted = list(fixed)
+    rejected = []
+    for candidate in sorted(candidates, key=lambda p: (-p.priority, -p.max_el, p.aos)):
+        clash = next((p for p in accepted if candidate.overlaps(p, gap)), None)
+        if clash is None:
+            accepted.append(candidate)
+        else:
+            candidate.reason = f'overlaps {clash.id}'
+            rejected.append(candidate)
+    return [p for p in accepted if p not in fixed], rejected
+
+
+class CaptureScheduler:
+    """Fires start_capture(scheduled_pass, duration) at each pass's AOS
+
+    In dry-run mode nothing is started; fired passes are only recorded, and
+    simulate() can step through the schedule on a virtual clock."""
+
+    def __init__(self, start_capture, profiles=SATELLITE_PROFILES, dry_run=False, lead=0.0, gap=0.0,
+                 clock=time.time, history=500):
+        self.start_capture = start_capture
+        self.profiles = profiles
+        self.dry_run = dry_run
+        self.lead = lead  # seconds to fire before AOS, to cover SatDump startup
+        self.gap = gap
+        self.clock = clock
+        self.passes = {}  # id -> ScheduledPass still scheduled or running
+        self.heap = []  # (fire time, seq, pass id); entries whose seq is not the pass's own are skipped
+        self.seq = 0
+        self.history = deque(maxlen=history)
+        self.cond = threading.Condition()
+        self.thread = None
+        self.stopping = False
+
+    def add_passes(self, responses):
+        """Schedule passes from N2YO-shaped responses; returns (accepted, rejected)"""
+        now = self.clock()
+        candidates = passes_from_responses(responses, self.profiles, now)
+        with self.cond:
+            self._prune(now)
+            # A fresh prediction of a pass we already have replaces the old one
+            for candidate in candidates:
+                for existing in list(self.passes.values()):
+                    if (existing.state == SCHEDULED and existing.satid == candidate.satid
+                            and existing.overlaps(candidate)):
+                        del self.passes[existing.id]
+            fixed = [p for p in self.passes.values() if p.state != SCHEDULED]
+            pending = [p for p in self.passes.values() if p.state == SCHEDULED]
+            accepted, rejected = resolve_conflicts(fixed, pending + candidates, self.gap)
+
+            for scheduled in rejected:
+                if scheduled.id in self.passes:
+                    # Bumped by a higher priority pass that just arrived
+                    del self.passes[scheduled.id]
+                    scheduled.state = CANCELLED
+                else:
+                    scheduled.state = SKIPPED
+                self.history.append(scheduled)
+            for scheduled in accepted:
+                if scheduled.id not in self.passes:
+                    self.passes[scheduled.id] = scheduled
+                    self._push(scheduled)
+            self.cond.notify_all()
+        new = [p for p in accepted if p in candidates]
+        return sorted(new, key=lambda p: p.aos), rejected
+
+    def cancel(self, pass_id):
+        with self.cond:
+            scheduled = self.passes.get(pass_id)
+            if scheduled is None or scheduled.state != SCHEDULED:
+                return scheduled
+            del self.passes[pass_id]
+            scheduled.state = CANCELLED
+            scheduled.reason = 'cancelled by user'
+            self.history.append(scheduled)
+            self.cond.notify_all()
+        return scheduled
+
+    def upcoming(self):
+        with self.cond:
+            self._prune(self.clock())
+            return sorted(self.passes.values(), key=lambda p: p.aos)
+
+    def _prune(self, now):
+        for pass_id in [p.id for p in self.passes.values() if p.state != SCHEDULED and p.los <= now]:
+            del self.passes[pass_id]
+
+    def _push(self, scheduled):
+        self.seq += 1
+        scheduled.seq = self.seq
+        heapq.heappush(self.heap, (scheduled.aos - self.lead, self.seq, scheduled.id))
+
+    def _pop_due(self, now):
+        due = {}
+        while self.heap and self.heap[0][0] <= now:
+            _, seq, pass_id = heapq.heappop(self.heap)
+            scheduled = self.passes.get(pass_id)
+            # A re-posted prediction replaces the pass object under the same id, so match on seq too
+            if scheduled is not None and scheduled.state == SCHEDULED and scheduled.seq == seq:
+                due[pass_id] = scheduled
+        return list(due.values())
+
+    def run_pending(self, now=None):
+        """Start every capture whose AOS has come; returns the passes fired"""
+        if now is None:
+            now = self.clock()
+        with self.cond:
+            due = self._pop_due(now)
+        for scheduled in due:
+            self._fire(scheduled, now)
+        return due
+
+    def simulate(self, until):
+        """Dry run only: walk the schedule up to until on a virtual clock, firing each pass at its AOS"""
+        if not self.dry_run:
+            raise RuntimeError('simulate() is only available in dry-run mode')
+        fired = []
+        while True:
+            with self.cond:
+                if not self.heap or self.heap[0][0] > until:
+                    break
+                fire_at = self.heap[0][0]
+            fired.extend(self.run_pending(fire_at))
+        return fired
+
+    def _fire(self, scheduled, now):
+        # Capture runs until LOS even if we fire late, and a pass that is nearly over is dropped
+        duration = scheduled.los - max(now, scheduled.aos - self.lead)
+        scheduled.fired_at = now
+        if duration < 10:
+            scheduled.state = SKIPPED
+            scheduled.reason = 'fired too close to LOS'
+        elif self.dry_run:
+            scheduled.state = DRY_RUN
+            scheduled.capture = {'duration': duration}
+        else:
+            try:
+                scheduled.capture = self.start_capture(scheduled, duration)
+                scheduled.state = STARTED
+            except Exception as e:
+                scheduled.state = FAILED
+                scheduled.reason = str(e)
+        with self.cond:
+            # Running captures stay listed until LOS so later passes cannot be booked over them
+            if scheduled.state not in (STARTED, DRY_RUN):
+                self.passes.pop(scheduled.id, None)
+            self.history.append(scheduled)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name='capture-scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+
+    def _loop(self):
+        while True:
+            self.run_pending()
+            with self.cond:
+                if self.stopping:
+                    return
+                wait = None
+                if self.heap:
+                    wait = max(0.0, self.heap[0][0] - self.clock())
+                # Re-check at least once a minute in case the wall clock jumps
+                self.cond.wait(timeout=min(wait, 60.0) if wait is not None else 60.0)
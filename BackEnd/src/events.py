@@ -0,0 +1,61 @@
+'''In-process publish/subscribe for job and progress events'''
+'''Each Server-Sent Events client gets its own bounded queue; a client that stops
+reading loses events instead of holding up the SatDump reader thread'''
+
+import json
+import queue
+import threading
+
+SUBSCRIBER_QUEUE_SIZE = 256
+HEARTBEAT_SECONDS = 15
+
+
+class EventBus:
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def publish(self, event_type, data):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait((event_type, data))
+            except queue.Full:
+                pass
+
+
+def format_sse(event_type, data):
+    return f'event: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+
+def stream_sse(bus, initial=(), job_id=None):
+    """Generator for an SSE response: initial events first, then live ones, with heartbeats
+
+    When job_id is given only events for that job are sent."""
+    q = bus.subscribe()
+    try:
+        for event_type, data in initial:
+            yield format_sse(event_type, data)
+        while True:
+            try:
+                event_type, data = q.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                # Comment line keeps proxies from closing an idle connection
+                yield ': heartbeat\n\n'
+                continue
+            if job_id is not None and data.get('job') != job_id:
+                continue
+            yield format_sse(event_type, data)
+    finally:
+        bus.unsubscribe(q)
@@ -0,0 +1,312 @@
+'''Image product index, thumbnails and tile pyramid for the /api/images gallery'''
+'''The scanner walks the SatDump output directory and only re-lists directories whose
+mtime changed; every indexed file is still stat'ed each scan and only re-read when its
+(size, mtime) fingerprint changed. Thumbnails are made
+when an image is indexed; pyramid tiles are cut on first request. Both live in an
+on-disk cache that evicts least recently used files past a byte limit'''
+
+import io
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from PIL import Image
+
+from database import db
+from models import Data, ImageFile
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+SATELLITE_PATTERNS = [
+    (re.compile(r'noaa[_ -]?(\d+)', re.IGNORECASE), 'NOAA-{}'),
+    (re.compile(r'meteor[_ -]?m2[_ -]?(\d)', re.IGNORECASE), 'METEOR-M2-{}'),
+    (re.compile(r'meteor', re.IGNORECASE), 'METEOR-M2'),
+    (re.compile(r'iss', re.IGNORECASE), 'ISS'),
+]
+# Let Pillow open the very large HRPT composites without the decompression bomb warning
+Image.MAX_IMAGE_PIXELS = 400_000_000
+
+
+def guess_satellite(relative_path):
+    for pattern, name in SATELLITE_PATTERNS:
+        match = pattern.search(relative_path)
+        if match:
+            return name.format(*match.groups())
+    return 'Unknown'
+
+
+def to_8bit(image):
+    """SatDump writes 16-bit greyscale PNGs; scale them down instead of letting convert() clip"""
+    if image.mode in ('I;16', 'I;16B', 'I'):
+        return image.point(lambda v: v / 256).convert('L')
+    return image
+
+
+def etag_for(image_file, variant=''):
+    return f'{image_file.size:x}-{image_file.mtime_ns:x}{variant}'
+
+
+class DiskCache:
+    """Files under root, evicted least recently used first once over max_bytes"""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # relative key -> size, oldest first
+        self.bytes = 0
+        os.makedirs(root, exist_ok=True)
+        existing = []
+        for directory, _, files in os.walk(root):
+            for name in files:
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                existing.append((stat.st_mtime, os.path.relpath(path, root), stat.st_size))
+        for _, key, size in sorted(existing):
+            self.entries[key] = size
+            self.bytes += size
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        """Path of a cached file, or None; a hit marks it most recently used"""
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+        path = self.path(key)
+        try:
+            os.utime(path)  # keeps LRU order across restarts
+        except FileNotFoundError:
+            with self.lock:
+                self.bytes -= self.entries.pop(key, 0)
+            return None
+        return path
+
+    def put(self, key, payload):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        with self.lock:
+            self.bytes += len(payload) - self.entries.pop(key, 0)
+            self.entries[key] = len(payload)
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, size = self.entries.popitem(last=False)
+                self.bytes -= size
+                try:
+                    os.remove(self.path(old_key))
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def discard_prefix(self, prefix):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                self.bytes -= self.entries.pop(key)
+                try:
+                    os.remove(self.path(key))
+                except FileNotFoundError:
+                    pass
+
+
+class ImageService:
+    def __init__(self, image_root, cache_dir, cache_max_bytes, thumbnail_size=256, tile_size=256):
+        self.image_root = os.path.abspath(image_root)
+        self.cache = DiskCache(cache_dir, cache_max_bytes)
+        self.thumbnail_size = thumbnail_size
+        self.tile_size = tile_size
+        self.dir_mtimes = {}  # directory -> (mtime_ns, subdirectories, images) from the last scan
+        self.scan_lock = threading.Lock()
+
+    # Indexing
+
+    def scan(self):
+        """Index new and changed images under image_root; returns counts of what changed"""
+        with self.scan_lock:
+            known = {row.path: row for row in ImageFile.query.all()}
+            counts = {'added': 0, 'updated': 0, 'removed': 0, 'directories_scanned': 0}
+            try:
+                self._scan_dir(self.image_root, known, counts)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            return counts
+
+    def _scan_dir(self, directory, known, counts):
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            return
+        cached = self.dir_mtimes.get(directory)
+        if cached is not None and cached[0] == mtime_ns:
+            # Nothing added, removed or renamed here since the last scan, so no listing is
+            # needed, but a file rewritten in place (avhrr.png on a re-decode) leaves the
+            # directory mtime alone and still has to be stat'ed
+            complete = True
+            for path in cached[2]:
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    complete = False  # a listing will notice the removal
+                    continue
+                complete &= self._index_file(path, stat, known.get(path), counts)
+            if not complete:
+                self.dir_mtimes.pop(directory, None)
+            for subdirectory in cached[1]:
+                self._scan_dir(subdirectory, known, counts)
+            return
+
+        counts['directories_scanned'] += 1
+        subdirectories = []
+        present = set()
+        complete = True
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    present.add(entry.path)
+                    stat = entry.stat()
+                    complete &= self._index_file(entry.path, stat, known.get(entry.path), counts)
+        for path, row in known.items():
+            if os.path.dirname(path) == directory and path not in present:
+                self._remove(row)
+                counts['removed'] += 1
+        # Finishing a half-written file does not touch the directory mtime, so only
+        # remember it once every image here is indexed, otherwise the file is never retried
+        if complete:
+            self.dir_mtimes[directory] = (mtime_ns, subdirectories, sorted(present))
+        else:
+            self.dir_mtimes.pop(directory, None)
+        for subdirectory in subdirectories:
+            self._scan_dir(subdirectory, known, counts)
+
+    def _index_file(self, path, stat, row, counts):
+        """Index one image; False when it could not be read yet and should be retried"""
+        if row is not None and row.size == stat.st_size and row.mtime_ns == stat.st_mtime_ns:
+            return True
+        try:
+            # Making the thumbnail decodes the whole file, which is what catches a PNG
+            # SatDump is still writing; the header alone opens fine
+            width, height, thumbnail = self._make_thumbnail(path)
+        except OSError:
+            # Still being written by SatDump, pick it up on the next scan
+            return False
+        relative = os.path.relpath(path, self.image_root).replace(os.sep, '/')
+        if row is None:
+            data = Data(title=relative, filepath=path, satellite=guess_satellite(relative),
+                        date=datetime.utcfromtimestamp(stat.st_mtime))
+            row = ImageFile(path=path, data=data)
+            db.session.add(row)
+            counts['added'] += 1
+        else:
+            self.cache.discard_prefix(f'{row.id}/')
+            row.data.date = datetime.utcfromtimestamp(stat.st_mtime)
+            counts['updated'] += 1
+        row.size = stat.st_size
+        row.mtime_ns = stat.st_mtime_ns
+        row.width = width
+        row.height = height
+        db.session.flush()
+        self.cache.put(self._thumbnail_key(row), thumbnail)
+        return True
+
+    def _remove(self, row):
+        self.cache.discard_prefix(f'{row.id}/')
+        data = row.data
+        db.session.delete(row)
+        if data is not None and not data.positions:
+            db.session.delete(data)
+
+    def resolve(self, relative):
+        """ImageFile for a path relative to image_root, refusing anything outside it"""
+        path = os.path.abspath(os.path.join(self.image_root, relative))
+        if os.path.commonpath([path, self.image_root]) != self.image_root:
+            return None
+        return ImageFile.query.filter_by(path=path).first()
+
+    # Derived products
+
+    def _thumbnail_key(self, image_file):
+        return f'{image_file.id}/thumb-{image_file.mtime_ns}.jpg'
+
+    def _make_thumbnail(self, path):
+        """(width, height, JPEG thumbnail bytes) of the image at path"""
+        with Image.open(path) as image:
+            width, height = image.size
+            image.draft('RGB', (self.thumbnail_size, self.thumbnail_size))  # JPEG: decode at reduced size
+            image = to_8bit(image).convert('RGB')
+            image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+            return width, height, self._encode(image, 'JPEG')
+
+    def thumbnail(self, image_file):
+        key = self._thumbnail_key(image_file)
+        path = self.cache.get(key)
+        if path is None:
+            path = self.cache.put(key, self._make_thumbnail(image_file.path)[2])
+        return path
+
+    def max_level(self, image_file):
+        """Pyramid level at which the image is at full resolution; level 0 fits one tile"""
+        longest = max(image_file.width, image_file.height)
+        return max(0, math.ceil(math.log2(longest / self.tile_size)))
+
+    def tile(self, image_file, z, x, y):
+        """Path of the cached PNG tile, or None when (z, x, y) is outside the pyramid"""
+        max_z = self.max_level(image_file)
+        if not 0 <= z <= max_z:
+            return None
+        scale = 2.0 ** (z - max_z)
+        level_width = math.ceil(image_file.width * scale)
+        level_height = math.ceil(image_file.height * scale)
+        if not (0 <= x < math.ceil(level_width / self.tile_size) and 0 <= y < math.ceil(level_height / self.tile_size)):
+            return None
+
+        key = f'{image_file.id}/tiles-{image_file.mtime_ns}/{z}/{x}/{y}.png'
+        path = self.cache.get(key)
+        if path is None:
+            size = self.tile_size / scale
+            box = (int(x * size), int(y * size),
+                   int(min((x + 1) * size, image_file.width)), int(min((y + 1) * size, image_file.height)))
+            with Image.open(image_file.path) as image:
+                region = to_8bit(image.crop(box))
+                out_size = (max(1, round((box[2] - box[0]) * scale)), max(1, round((box[3] - box[1]) * scale)))
+                if out_size != region.size:
+                    region = region.resize(out_size, Image.LANCZOS)
+                path = self.cache.put(key, self._encode(region, 'PNG'))
+        return path
+
+    def _encode(self, image, fmt):
+        buffer = io.BytesIO()
+        if fmt == 'JPEG':
+            image.save(buffer, fmt, quality=85, optimize=True)
+        else:
+            image.save(buffer, fmt, optimize=False)
+        return buffer.getvalue()
+
+    def describe(self, image_file):
+        """Gallery entry in the shape ViewImages.js uses"""
+        data = image_file.data
+        relative = os.path.relpath(image_file.path, self.image_root).replace(os.sep, '/')
+        return {
+            'id': image_file.id,
+            'data_id': data.id,
+            'name': os.path.basename(image_file.path),
+            'date': data.date.strftime('%Y-%m-%d'),
+            'time': data.date.strftime('%H:%M:%S'),
+            'satellite': data.satellite,
+            'size': f'{image_file.size / 1e6:.1f} MB',
+            'bytes': image_file.size,
+            'resolution': f'{image_file.width}x{image_file.height}',
+            'max_level': self.max_level(image_file),
+            'url': f'/api/images/{relative}',
+            'thumbnail': f'/api/images/{image_file.id}/thumbnail',
+            'tiles': f'/api/images/{image_file.id}/tiles/{{z}}/{{x}}/{{y}}.png',
+        }
@@ -0,0 +1,240 @@
+'''Bounded worker pool for SatDump jobs'''
+'''Jobs queue up and run on a fixed number of worker threads. A job that needs an SDR
+only starts once no other job holds that device, so repeated clicks queue (or are
+deduplicated) instead of fighting over the rtlsdr. Device jobs go ahead of the rest of
+the queue and have workers of their own, so a scheduled pass never waits behind an
+hour-long offline decode'''
+
+import os
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMEOUT = 'timeout'
+FINISHED_STATES = (DONE, FAILED, CANCELLED, TIMEOUT)
+LOG_TAIL = 200
+
+
+def terminate_process(p):
+    """Kill a shell=True process together with the SatDump process it started"""
+    if p.poll() is not None:
+        return
+    if os.name == 'nt':
+        subprocess.run(['taskkill', '/F', '/T', '/PID', str(p.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        try:
+            os.killpg(p.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+class Job:
+    def __init__(self, kind, target, device=None, timeout=None, kwargs=None, listener=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.target = target
+        self.device = device
+        self.timeout = timeout
+        self.kwargs = kwargs or {}
+        self.state = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.returncode = None
+        self.error = None
+        self.process = None
+        self.cancel_requested = threading.Event()
+        self.timed_out = False
+        self.progress = {}
+        self.log_tail = deque(maxlen=LOG_TAIL)
+        # listener(event_type, data) receives 'job', 'progress' and 'log' events
+        self.listener = listener
+        self.lock = threading.Lock()
+
+    def attach_process(self, p):
+        """Called by sd_control once the subprocess exists, so the job can be cancelled"""
+        with self.lock:
+            self.process = p
+        if self.cancel_requested.is_set():
+            terminate_process(p)
+
+    def log(self, line):
+        self.log_tail.append(line)
+        self.publish('log', {'line': line})
+
+    def report_progress(self, event):
+        """Merge a parsed progress event into the latest known progress and pass it on"""
+        with self.lock:
+            self.progress.update(event)
+        self.publish('progress', event)
+
+    def publish(self, event_type, data):
+        if self.listener is not None:
+            self.listener(event_type, dict(data, job=self.id, kind=self.kind))
+
+    def stop(self):
+        self.cancel_requested.set()
+        with self.lock:
+            p = self.process
+        if p is not None:
+            terminate_process(p)
+
+    def to_dict(self):
+        now = time.time()
+        runtime = None
+        if self.started is not None:
+            runtime = (self.finished or now) - self.started
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'device': self.device,
+            'state': self.state,
+            'params': self.kwargs,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'runtime': runtime,
+            'timeout': self.timeout,
+            'returncode': self.returncode,
+            'error': self.error,
+            'progress': dict(self.progress),
+        }
+
+
+class JobManager:
+    def __init__(self, workers=2, history=200, listener=None, device_workers=1):
+        self.history = history
+        self.listener = listener
+        self.jobs = {}  # id -> Job, in submission order
+        self.queue = deque()
+        self.busy_devices = set()
+        self.cond = threading.Condition()
+        self.threads = [threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+                        for i in range(workers)]
+        # Reserved for jobs that need an SDR, so CPU jobs can never occupy every worker
+        self.threads += [threading.Thread(target=self._worker, args=(True,), name=f'device-worker-{i}', daemon=True)
+                         for i in range(device_workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, kind, target, device=None, timeout=None, dedupe=True, **kwargs):
+        """Queue target(job=job, **kwargs); returns (job, created)
+
+        With dedupe, an identical job that is still queued or running is returned
+        instead of starting another one."""
+        with self.cond:
+            if dedupe:
+                for job in self.jobs.values():
+                    if job.kind == kind and job.kwargs == kwargs and job.state in (QUEUED, RUNNING):
+                        return job, False
+            job = Job(kind, target, device, timeout, kwargs, self.listener)
+            self.jobs[job.id] = job
+            self.queue.append(job)
+            self._prune()
+            self.cond.notify_all()
+        job.publish('job', job.to_dict())
+        return job, True
+
+    def get(self, job_id):
+        with self.cond:
+            return self.jobs.get(job_id)
+
+    def list(self, state=None):
+        with self.cond:
+            return [job for job in self.jobs.values() if state is None or job.state == state]
+
+    def queue_depth(self):
+        with self.cond:
+            return len(self.queue)
+
+    def cancel(self, job_id):
+        """Cancel a queued job outright or stop a running one; returns the job or None"""
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.state in FINISHED_STATES:
+                return job
+            if job.state == QUEUED:
+                self.queue.remove(job)
+                job.state = CANCELLED
+                job.finished = time.time()
+        if job.state == CANCELLED:
+            job.publish('job', job.to_dict())
+            return job
+        job.stop()
+        return job
+
+    def _next_runnable(self, devices_only=False):
+        # Device jobs first: they are tied to a pass or a person at the radio
+        for job in self.queue:
+            if job.device is not None and job.device not in self.busy_devices:
+                self.queue.remove(job)
+                return job
+        if not devices_only:
+            for job in self.queue:
+                if job.device is None:
+                    self.queue.remove(job)
+                    return job
+        return None
+
+    def _worker(self, devices_only=False):
+        while True:
+            with self.cond:
+                job = self._next_runnable(devices_only)
+                while job is None:
+                    self.cond.wait()
+                    job = self._next_runnable(devices_only)
+                job.state = RUNNING
+                job.started = time.time()
+                if job.device is not None:
+                    self.busy_devices.add(job.device)
+            job.publish('job', job.to_dict())
+            self._run(job)
+            with self.cond:
+                if job.device is not None:
+                    self.busy_devices.discard(job.device)
+                self.cond.notify_all()
+
+    def _run(self, job):
+        timer = None
+        if job.timeout:
+            timer = threading.Timer(job.timeout, self._expire, args=(job,))
+            timer.daemon = True
+            timer.start()
+        try:
+            job.target(job=job, **job.kwargs)
+        except Exception as e:
+            job.error = str(e)
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        if job.process is not None:
+            job.returncode = job.process.returncode
+        if job.timed_out:
+            job.state = TIMEOUT
+        elif job.cancel_requested.is_set():
+            job.state = CANCELLED
+        elif job.error is not None or job.returncode:
+            job.state = FAILED
+        else:
+            job.state = DONE
+        job.finished = time.time()
+        job.publish('job', job.to_dict())
+
+    def _expire(self, job):
+        job.timed_out = True
+        job.stop()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
@@ -0,0 +1,353 @@
+'''Counters, gauges and histograms rendered in the Prometheus text format for /metrics'''
+'''Kept dependency free: a metric is a dict of label values -> numbers behind a lock, and
+collectors registered on the registry refresh gauges from live state at scrape time.
+Also holds the Flask, SQLAlchemy and job hooks that feed the default registry, and an
+opt-in sampling profiler that records where slow requests spent their time'''
+
+import logging
+import math
+import sys
+import threading
+import time
+from collections import Counter as StackCounter, deque
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds; wide enough for a 1 ms SQLite read and a 10 s N2YO timeout
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# SatDump runs last from seconds (offline decode) to a full pass
+JOB_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 900, 1200, 1800, 3600)
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}  # label values -> number (or histogram state)
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f'{self.name} takes labels {self.labels}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            items = sorted(self.values.items())
+        for values, value in items:
+            lines.extend(self.samples(values, value))
+        return lines
+
+    def samples(self, values, value):
+        return [f'{self.name}{format_labels(self.labels, values)} {format_value(value)}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self, values, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = format_labels(self.labels, values, [('le', format_value(float(bound)))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = format_labels(self.labels, values)
+        lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f'metric {metric.name} already registered')
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collect):
+        """collect() runs before every render, to copy live state into gauges"""
+        self.collectors.append(collect)
+
+    def render(self):
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception:
+                logger.exception('metrics collector failed')
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time to produce a response (headers only for streamed responses)',
+    ('method', 'route', 'status'))
+REQUESTS_IN_FLIGHT = REGISTRY.gauge('http_requests_in_flight', 'Requests currently being handled')
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    'n2yo_upstream_duration_seconds', 'N2YO API round trips made on a cache miss', ('endpoint', 'outcome'))
+N2YO_CACHE = REGISTRY.gauge('n2yo_cache', 'N2YO response cache counters and size', ('stat',))
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'db_query_duration_seconds', 'SQL statement execution time', ('statement',))
+JOB_SECONDS = REGISTRY.histogram(
+    'job_runtime_seconds', 'Wall time of finished SatDump jobs', ('kind', 'state'), buckets=JOB_BUCKETS)
+JOBS_FINISHED = REGISTRY.counter(
+    'jobs_finished_total', 'Finished SatDump jobs by final state and exit code', ('kind', 'state', 'returncode'))
+JOB_QUEUE_DEPTH = REGISTRY.gauge('job_queue_depth', 'Jobs waiting for a worker or a free device')
+JOBS_RUNNING = REGISTRY.gauge('jobs_running', 'Jobs currently running')
+SLOW_REQUESTS = REGISTRY.counter(
+    'http_slow_requests_total', 'Requests over the profiling threshold', ('route',))
+
+
+def observe_job_event(event_type, data):
+    """Job manager listener: record runtime and exit code once a job reaches a final state"""
+    if event_type != 'job' or data.get('finished') is None:
+        return
+    returncode = data.get('returncode')
+    if data.get('runtime') is not None:  # None for jobs cancelled while still queued
+        JOB_SECONDS.observe(data['runtime'], kind=data['kind'], state=data['state'])
+    JOBS_FINISHED.inc(kind=data['kind'], state=data['state'],
+                      returncode='none' if returncode is None else returncode)
+
+
+def track_jobs(job_manager):
+    def collect():
+        JOB_QUEUE_DEPTH.set(job_manager.queue_depth())
+        JOBS_RUNNING.set(sum(1 for job in job_manager.list() if job.state == 'running'))
+    REGISTRY.add_collector(collect)
+
+
+def track_n2yo_cache(cache_stats):
+    def collect():
+        for stat, value in cache_stats().items():
+            N2YO_CACHE.set(value, stat=stat)
+    REGISTRY.add_collector(collect)
+
+
+# SQLAlchemy: every engine, like the SQLite pragmas in database.py
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'EMPTY'
+    DB_QUERY_SECONDS.observe(time.perf_counter() - starts.pop(), statement=verb)
+
+
+def instrument_sqlalchemy():
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+# Flask
+
+class SlowRequestProfiler:
+    """Samples the stacks of in-flight requests and keeps the ones that ran past threshold
+
+    One daemon thread wakes every interval seconds while any request is active and
+    reads its frame from sys._current_frames(); the cost is paid only when enabled."""
+
+    def __init__(self, threshold, interval=0.005, keep=20, depth=40):
+        self.threshold = threshold
+        self.interval = interval
+        self.depth = depth
+        self.active = {}  # thread ident -> Counter of collapsed stacks
+        self.recent = deque(maxlen=keep)
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def begin(self):
+        with self.lock:
+            self.active[threading.get_ident()] = StackCounter()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._sample, name='slow-request-profiler', daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def end(self, route, duration):
+        with self.lock:
+            stacks = self.active.pop(threading.get_ident(), None)
+        if stacks is None or duration < self.threshold:
+            return None
+        profile = {
+            'route': route,
+            'duration': duration,
+            'finished': time.time(),
+            'samples': sum(stacks.values()),
+            # Collapsed "file:function:line;..." stacks, the input format of flamegraph tools
+            'stacks': [{'stack': stack, 'count': count} for stack, count in stacks.most_common(25)],
+        }
+        self.recent.append(profile)
+        logger.warning('slow request %s took %.3f s, top stack: %s', route, duration,
+                       profile['stacks'][0]['stack'] if profile['stacks'] else 'none sampled')
+        return profile
+
+    def collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < self.depth:
+            code = frame.f_code
+            names.append(f'{code.co_filename.rsplit("/", 1)[-1]}:{code.co_name}:{frame.f_lineno}')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _sample(self):
+        while True:
+            self.wake.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                if not self.active:
+                    self.wake.clear()
+                    continue
+                for ident, stacks in self.active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[self.collapse(frame)] += 1
+
+
+def instrument_app(app, profile_threshold=None):
+    """Time every request by route template; with profile_threshold (seconds), profile slow ones"""
+    profiler = SlowRequestProfiler(profile_threshold) if profile_threshold else None
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        if profiler is not None:
+            profiler.begin()
+
+    @app.after_request
+    def record_request_time(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        REQUESTS_IN_FLIGHT.dec()
+        # The rule, not the path, so /jobs/<job_id> is one series rather than one per job
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(duration, method=request.method, route=route, status=response.status_code)
+        if profiler is not None and profiler.end(route, duration) is not None:
+            SLOW_REQUESTS.inc(route=route)
+        return response
+
+    @app.teardown_request
+    def drop_request_timer(exc):
+        # after_request is skipped when a view raises, keep the in-flight gauge honest
+        if g.pop('metrics_start', None) is not None:
+            REQUESTS_IN_FLIGHT.dec()
+            if profiler is not None:
+                profiler.end(None, 0.0)
+
+    return profiler
@@ -1,15 +1,143 @@
 import sqlite3
 import requests
+import hashlib
 import json
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+
+from src.metrics import UPSTREAM_SECONDS
 
 #Compiler Directives for DB Connection Needed: For TEST and PROD
 #Establish DB Connection (Should be set for VisualPass or SatellitePos)
 con = sqlite3.connect("visualPass.db")
-api_url = "https://api.n2yo.com/rest/v1/satellite/"
+#N2YO_API_URL points the client at a local stub for load tests
+api_url = os.getenv("N2YO_API_URL", "https://api.n2yo.com/rest/v1/satellite/")
 api_key = os.getenv("N2YO_API_KEY")
 
+#Pass predictions only shift by seconds over half an hour, TLEs are republished a few times a day
+VISUAL_PASSES_TTL = float(os.getenv("N2YO_PASSES_TTL", 1800))
+TLE_TTL = float(os.getenv("N2YO_TLE_TTL", 6 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("N2YO_CACHE_MAX_ENTRIES", 512))
+CACHE_MAX_BYTES = int(os.getenv("N2YO_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+REQUEST_TIMEOUT = 10
+
+#One pooled session so repeat calls reuse the TLS connection to N2YO
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=8))
+
+
+class ResponseCache:
+    """TTL + LRU cache for decoded N2YO responses, bounded by entry count and approximate bytes"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (expires, size, value)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.inflight = {}  # (key, credential) -> _Call shared by concurrent identical requests
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expired": 0,
+                      "upstream_calls": 0, "upstream_errors": 0, "upstream_seconds": 0.0}
+
+    def get_or_fetch(self, key, ttl, fetch, credential=None):
+        """Cached value for key, else fetch() it; concurrent misses only share one upstream
+        call when they also share the credential, so an error body for one caller's bad
+        API key is never handed to another"""
+        flight = (key, credential)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[2]
+                self._remove(key)
+                self.stats["expired"] += 1
+            call = self.inflight.get(flight)
+            if call is not None:
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                call = self.inflight[flight] = _Call()
+                self.stats["misses"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        start = time.perf_counter()
+        try:
+            call.value = fetch()
+        except Exception as e:
+            call.error = e
+        elapsed = time.perf_counter() - start
+        #N2YO reports bad keys and quota exhaustion in the body, never cache those
+        body_error = call.error is None and isinstance(call.value, dict) and "error" in call.value
+        failed = call.error is not None or body_error
+        UPSTREAM_SECONDS.observe(elapsed, endpoint=key[0], outcome="error" if failed else "ok")
+
+        with self.lock:
+            self.stats["upstream_calls"] += 1
+            self.stats["upstream_seconds"] += elapsed
+            del self.inflight[flight]
+            if failed:
+                self.stats["upstream_errors"] += 1
+            else:
+                self._store(key, ttl, call.value)
+        call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def _store(self, key, ttl, value):
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + ttl, size, value)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def snapshot(self):
+        """Counters for scraping, plus current size and mean upstream latency"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+            stats["bytes"] = self.bytes
+            stats["inflight"] = len(self.inflight)
+        calls = stats["upstream_calls"]
+        stats["upstream_mean_ms"] = stats["upstream_seconds"] / calls * 1000 if calls else 0.0
+        return stats
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+cache = ResponseCache()
+
 # User Input for N2YO API, minimum parameters needed for visual pass or satellite positions
 def user_input():
     id = int(input("Enter the satellite ID: "))
@@ -21,11 +149,33 @@ def user_input():
     api_key = input("Enter the API key: ")
     return id, observer_lat, observer_lng, observer_alt, days, min_visibility, api_key
 
-def fetch_visualPasses(id, observer_lat, observer_lng, observer_alt, days, min_visibility, api_key):
-    response = requests.get(f"{api_url}/visualpasses/{id}/{observer_lat}/{observer_lng}/{observer_alt}/{days}/{min_visibility}/&apiKey={api_key}")
+def _get_json(url):
+    response = session.get(url, timeout=REQUEST_TIMEOUT)
     json_data = response.json()
     return json_data
 
+def _credential(api_key):
+    #Tells callers' keys apart for request coalescing without keeping the keys themselves
+    return hashlib.sha256(str(api_key).encode()).hexdigest()[:16]
+
+def fetch_visualPasses(id, observer_lat, observer_lng, observer_alt, days, min_visibility, api_key):
+    #Normalize so 41.7 and "41.70" from different clients share a cache entry
+    id, days, min_visibility = int(id), int(days), int(min_visibility)
+    observer_lat, observer_lng = round(float(observer_lat), 4), round(float(observer_lng), 4)
+    observer_alt = int(round(float(observer_alt)))
+    key = ("visualpasses", id, observer_lat, observer_lng, observer_alt, days, min_visibility)
+    return cache.get_or_fetch(key, VISUAL_PASSES_TTL, lambda: _get_json(
+        f"{api_url}/visualpasses/{id}/{observer_lat}/{observer_lng}/{observer_alt}/{days}/{min_visibility}/&apiKey={api_key}"),
+        credential=_credential(api_key))
+
+def fetch_tle(id, api_key):
+    id = int(id)
+    return cache.get_or_fetch(("tle", id), TLE_TTL, lambda: _get_json(f"{api_url}/tle/{id}&apiKey={api_key}"),
+                              credential=_credential(api_key))
+
+def cache_stats():
+    return cache.snapshot()
+
 def write_to_visualPass_db(json_data):
     #Create DB cursor and table
     cur = con.cursor()
@@ -41,6 +191,10 @@ def write_to_visualPass_db(json_data):
 # Request: /visualpasses/{id}/{observer_lat}/{observer_lng}/{observer_alt}/{days}/{min_visibility} 
 # Visual Pass: https://api.n2yo.com/rest/v1/satellite/visualpasses/25544/41.702/-76.014/0/2/300/&apiKey=
 
+# Example - retrieve Space Station (25544) TLE
+# Request: /tle/{id}
+# TLE: https://api.n2yo.com/rest/v1/satellite/tle/25544&apiKey=
+
 # Example - retrieve Space Station (25544) positions for next 2 seconds. Observer is located at lat: 41.702, lng: -76.014, alt: 0
 # Request: /positions/{id}/{observer_lat}/{observer_lng}/{observer_alt}/{seconds}
 # Satellite Positions: https://api.n2yo.com/rest/v1/satellite/positions/25544/41.702/-76.014/0/2/&apiKey=
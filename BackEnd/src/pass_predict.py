@@ -0,0 +1,334 @@
+'''Local pass prediction from stored TLE sets'''
+'''Propagates many satellites at once with SGP4 and searches for horizon crossings,
+returning passes in the same shape as the N2YO visualpasses/radiopasses responses'''
+
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+import numpy as np
+from sgp4.api import Satrec, SatrecArray
+
+EARTH_RADIUS_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+UNIX_EPOCH_JD = 2440587.5
+COMPASS_POINTS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                  'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+# N2YO reports this magnitude when no brightness estimate is available
+UNKNOWN_MAG = 100000
+# Sun elevation (degrees) below which the observer is considered to be in darkness
+DARK_SUN_ELEVATION = -6.0
+# Satellites are propagated in groups of at most this many satellite-samples, which keeps
+# the (S, T, 3) arrays and their temporaries to a few hundred MB however many are asked for
+MAX_BATCH_SAMPLES = 1_000_000
+
+
+class Observer(NamedTuple):
+    lat: float
+    lng: float
+    alt: float = 0.0  # meters above sea level, same as the N2YO API
+
+
+class Satellite(NamedTuple):
+    satid: int
+    satname: str
+    satrec: Satrec
+
+
+def parse_tle_text(text):
+    """Parse 2-line or 3-line TLE sets into (name, line1, line2) tuples"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    sets = []
+    name = None
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith('1 ') and i + 1 < len(lines) and lines[i + 1].startswith('2 '):
+            sets.append((name, line, lines[i + 1]))
+            name = None
+            i += 2
+            continue
+        name = line[2:].strip() if line.startswith('0 ') else line
+        i += 1
+    if not sets:
+        raise ValueError('No TLE sets found')
+    return sets
+
+
+def tle_epoch(line1):
+    """Epoch of a TLE as a naive UTC datetime"""
+    year = int(line1[18:20])
+    year += 2000 if year < 57 else 1900
+    day = float(line1[20:32])
+    return datetime(year, 1, 1) + timedelta(days=day - 1)
+
+
+def make_satellite(satid, satname, line1, line2):
+    """Build a Satellite from a TLE; satid may be None to take the catalog number from the TLE"""
+    satrec = Satrec.twoline2rv(line1, line2)
+    if satid is None:
+        satid = satrec.satnum
+    if satrec.error:
+        raise ValueError(f'Invalid TLE for satellite {satid}')
+    return Satellite(int(satid), satname or str(satid), satrec)
+
+
+def tle_epoch_unix(satellite):
+    """Epoch of a satellite's TLE as a unix timestamp"""
+    return (satellite.satrec.jdsatepoch - UNIX_EPOCH_JD + satellite.satrec.jdsatepochF) * 86400.0
+
+
+def tle_info(satellite, now=None):
+    """Epoch and age (days) of a satellite's TLE, for API responses"""
+    if now is None:
+        now = time.time()
+    epoch = tle_epoch_unix(satellite)
+    return {'satid': satellite.satid,
+            'epoch': datetime.utcfromtimestamp(epoch).isoformat(),
+            'age_days': round((now - epoch) / 86400.0, 2)}
+
+
+def unix_to_jd(unix_times):
+    """Split unix timestamps into the (whole, fraction) Julian date pair SGP4 wants"""
+    unix_times = np.asarray(unix_times, dtype=np.float64)
+    days = np.floor(unix_times / 86400.0)
+    return UNIX_EPOCH_JD + days, (unix_times - days * 86400.0) / 86400.0
+
+
+def gmst(jd, fr):
+    """Greenwich mean sidereal time in radians (IAU-82, same as SGP4's gstime)"""
+    tut1 = ((jd - 2451545.0) + fr) / 36525.0
+    seconds = (-6.2e-6 * tut1 ** 3 + 0.093104 * tut1 ** 2
+               + (876600.0 * 3600 + 8640184.812866) * tut1 + 67310.54841)
+    return np.mod(np.radians(seconds / 240.0), 2 * np.pi)
+
+
+def sun_direction(jd, fr):
+    """Unit vector towards the sun in the TEME frame (low precision, ~0.01 deg)"""
+    t = ((jd - 2451545.0) + fr) / 36525.0
+    mean_lon = np.radians(280.460 + 36000.771 * t)
+    mean_anom = np.radians(357.5291092 + 35999.05034 * t)
+    ecl_lon = mean_lon + np.radians(1.914666471 * np.sin(mean_anom) + 0.019994643 * np.sin(2 * mean_anom))
+    obliquity = np.radians(23.439291 - 0.0130042 * t)
+    return np.stack([np.cos(ecl_lon),
+                     np.cos(obliquity) * np.sin(ecl_lon),
+                     np.sin(obliquity) * np.sin(ecl_lon)], axis=-1)
+
+
+def teme_to_ecef(r, theta):
+    """Rotate TEME vectors (..., T, 3) into the Earth-fixed frame by sidereal angle theta (T,)"""
+    c, s = np.cos(theta), np.sin(theta)
+    x, y, z = r[..., 0], r[..., 1], r[..., 2]
+    return np.stack([c * x + s * y, -s * x + c * y, z], axis=-1)
+
+
+def observer_frame(observer):
+    """ECEF position (km) and the rows of the ECEF->ENU rotation for an observer"""
+    lat, lng = np.radians(observer.lat), np.radians(observer.lng)
+    e2 = WGS84_F * (2 - WGS84_F)
+    n = EARTH_RADIUS_KM / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    alt = observer.alt / 1000.0
+    position = np.array([(n + alt) * np.cos(lat) * np.cos(lng),
+                         (n + alt) * np.cos(lat) * np.sin(lng),
+                         (n * (1 - e2) + alt) * np.sin(lat)])
+    enu = np.array([[-np.sin(lng), np.cos(lng), 0.0],
+                    [-np.sin(lat) * np.cos(lng), -np.sin(lat) * np.sin(lng), np.cos(lat)],
+                    [np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)]])
+    return position, enu
+
+
+def look_angles(r, errors, jd, fr, observer, visual=False):
+    """Azimuth/elevation (degrees) of TEME positions r (S, T, 3) seen from one observer
+
+    When visual is set, also returns a mask of samples where the satellite is sunlit
+    while the observer is in darkness."""
+    theta = gmst(jd, fr)
+    position, enu = observer_frame(observer)
+    rho = teme_to_ecef(r, theta) - position
+    local = rho @ enu.T
+    distance = np.linalg.norm(local, axis=-1)
+    el = np.degrees(np.arcsin(np.clip(local[..., 2] / distance, -1.0, 1.0)))
+    az = np.mod(np.degrees(np.arctan2(local[..., 0], local[..., 1])), 360.0)
+    # Samples SGP4 could not propagate (decayed, bad elements) never count as visible
+    el = np.where(errors != 0, -90.0, el)
+    if not visual:
+        return az, el, None
+
+    sun = sun_direction(jd, fr)
+    along = np.einsum('stk,tk->st', r, sun)
+    perpendicular = np.linalg.norm(r - along[..., None] * sun, axis=-1)
+    sunlit = (along > 0) | (perpendicular > EARTH_RADIUS_KM)
+    sun_up = teme_to_ecef(sun, theta) @ enu[2]
+    dark = np.degrees(np.arcsin(np.clip(sun_up, -1.0, 1.0))) < DARK_SUN_ELEVATION
+    return az, el, sunlit & dark[None, :]
+
+
+def look_track(satellite, observer, unix_times):
+    """Azimuth/elevation (degrees) of one satellite at the given unix times"""
+    jd, fr = unix_to_jd(unix_times)
+    e, r, _ = satellite.satrec.sgp4_array(jd, fr)
+    az, el, _ = look_angles(r[None], e[None], jd, fr, observer)
+    return az[0], el[0]
+
+
+def compass(az):
+    return COMPASS_POINTS[int((az % 360.0) / 22.5 + 0.5) % 16]
+
+
+def _runs(mask):
+    """Start/end indices (inclusive) of True runs in each row of a 2-D mask"""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends - 1
+
+
+class _Refiner:
+    """Re-propagates one satellite on a fine grid to pin down pass edges to the second"""
+
+    def __init__(self, satellite, observer, min_elevation, visual):
+        self.satrec = satellite.satrec
+        self.observer = observer
+        self.min_elevation = min_elevation
+        self.visual = visual
+
+    def sample(self, unix_times):
+        jd, fr = unix_to_jd(unix_times)
+        e, r, _ = self.satrec.sgp4_array(jd, fr)
+        az, el, visible = look_angles(r[None], e[None], jd, fr, self.observer, self.visual)
+        mask = el[0] >= self.min_elevation
+        if visible is not None:
+            mask &= visible[0]
+        return az[0], el[0], mask
+
+    def edge(self, t_before, t_after, rising):
+        """Time, az and el of the first/last in-pass second between two coarse samples"""
+        times = np.arange(t_before, t_after + 1.0, 1.0)
+        az, el, mask = self.sample(times)
+        hits = np.nonzero(mask)[0]
+        if not len(hits):
+            idx = -1 if rising else 0
+        else:
+            idx = hits[0] if rising else hits[-1]
+        return times[idx], az[idx], el[idx]
+
+    def peak(self, t_center, half_width, t_start, t_end):
+        """Highest sample within half_width of t_center, clipped to the pass itself"""
+        times = np.arange(max(t_center - half_width, t_start), min(t_center + half_width, t_end) + 1.0, 1.0)
+        az, el, _ = self.sample(times)
+        idx = int(np.argmax(el))
+        return times[idx], az[idx], el[idx]
+
+
+def predict_passes(satellites, observers, start=None, days=2, min_visibility=0,
+                   min_elevation=0.0, visual=False, step=30.0):
+    """Predict passes for every satellite/observer pair in one batch
+
+    Returns a list indexed [satellite][observer] of N2YO-shaped responses
+    ({'info': {...}, 'passes': [...]}). With visual=True only the portions of a
+    pass where the satellite is sunlit and the observer is in darkness count,
+    matching the visualpasses endpoint; otherwise passes run horizon to horizon."""
+    if start is None:
+        start = time.time()
+    start = float(start)
+    times = start + np.arange(0.0, days * 86400.0 + step, step)
+    jd, fr = unix_to_jd(times)
+    group = max(1, MAX_BATCH_SAMPLES // len(times))
+    results = []
+    for first in range(0, len(satellites), group):
+        results += _predict_group(satellites[first:first + group], observers, times, jd, fr,
+                                  min_visibility, min_elevation, visual, step)
+    return results
+
+
+def _predict_group(satellites, observers, times, jd, fr, min_visibility, min_elevation, visual, step):
+    """predict_passes for one group of satellites propagated together"""
+    sat_array = SatrecArray([sat.satrec for sat in satellites])
+    errors, r, _ = sat_array.sgp4(jd, fr)
+
+    results = [[None] * len(observers) for _ in satellites]
+    for o, observer in enumerate(observers):
+        az, el, visible = look_angles(r, errors, jd, fr, observer, visual)
+        mask = el >= min_elevation
+        if visible is not None:
+            mask &= visible
+
+        passes = [[] for _ in satellites]
+        rows, starts, ends = _runs(mask)
+        for s, i0, i1 in zip(rows, starts, ends):
+            # Passes already in progress at the start or still running at the
+            # end of the window are incomplete, so they are left out
+            if i0 == 0 or i1 == len(times) - 1:
+                continue
+            refiner = _Refiner(satellites[s], observer, min_elevation, visual)
+            start_utc, start_az, start_el = refiner.edge(times[i0 - 1], times[i0], rising=True)
+            end_utc, end_az, end_el = refiner.edge(times[i1], times[i1 + 1], rising=False)
+            duration = end_utc - start_utc
+            if duration < min_visibility:
+                continue
+            i_max = i0 + int(np.argmax(el[s, i0:i1 + 1]))
+            max_utc, max_az, max_el = refiner.peak(times[i_max], step, start_utc, end_utc)
+            passes[s].append({
+                'startAz': round(float(start_az), 2),
+                'startAzCompass': compass(start_az),
+                'startEl': round(float(start_el), 2),
+                'startUTC': int(start_utc),
+                'maxAz': round(float(max_az), 2),
+                'maxAzCompass': compass(max_az),
+                'maxEl': round(float(max_el), 2),
+                'maxUTC': int(max_utc),
+                'endAz': round(float(end_az), 2),
+                'endAzCompass': compass(end_az),
+                'endEl': round(float(end_el), 2),
+                'endUTC': int(end_utc),
+                'mag': UNKNOWN_MAG,
+                'duration': int(duration),
+            })
+
+        for s, satellite in enumerate(satellites):
+            results[s][o] = {
+                'info': {
+                    'satid': satellite.satid,
+                    'satname': satellite.satname,
+                    'transactionscount': 0,
+                    'passescount': len(passes[s]),
+                },
+                'passes': passes[s],
+            }
+    return results
+
+
+# Database helpers, kept separate from the propagation code so it can run without Flask
+
+def store_tles(text):
+    """Insert or update TLE rows from raw TLE text, returns the stored satellite ids"""
+    from database import db
+    from models import TLE
+
+    stored = []
+    for name, line1, line2 in parse_tle_text(text):
+        satellite = make_satellite(None, name, line1, line2)
+        row = TLE.query.filter_by(satid=satellite.satid).first()
+        if row is None:
+            row = TLE(satid=satellite.satid)
+            db.session.add(row)
+        row.satname = satellite.satname
+        row.line1 = line1
+        row.line2 = line2
+        row.epoch = tle_epoch(line1)
+        stored.append(satellite.satid)
+    db.session.commit()
+    return stored
+
+
+def load_satellites(satids):
+    """Satellites for the given ids from the TLE table, in the same order; None when any is missing"""
+    from models import TLE
+
+    rows = {row.satid: row for row in TLE.query.filter(TLE.satid.in_(satids)).all()}
+    if any(int(satid) not in rows for satid in satids):
+        return None
+    return [make_satellite(row.satid, row.satname, row.line1, row.line2)
+            for row in (rows[int(satid)] for satid in satids)]
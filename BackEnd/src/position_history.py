@@ -0,0 +1,135 @@
+'''Time-windowed, paginated and downsampled reads of a capture's position history'''
+'''Rows come off the (data_id, timestamp) index in one streaming query, so a multi-hour
+track is never loaded into memory before it is sent'''
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, select
+
+from database import db
+from models import Positions
+from src.positions_ingest import POSITION_FIELDS, to_datetime
+
+COLUMNS = ('id', 'timestamp') + POSITION_FIELDS
+DEFAULT_LIMIT = 5000
+MAX_LIMIT = 100000
+FETCH_SIZE = 2000
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(row):
+    return base64.urlsafe_b64encode(f'{row.timestamp.isoformat()}|{row.id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+    return to_datetime(timestamp), int(row_id)
+
+
+def iter_positions(data_id, start=None, end=None, cursor=None):
+    """Rows for one capture in (timestamp, id) order, fetched FETCH_SIZE at a time
+
+    Arguments are parsed and the query started right away, so bad input raises here
+    rather than halfway through a streamed response."""
+    table = Positions.__table__
+    query = select(*(table.c[name] for name in COLUMNS)).where(table.c.data_id == data_id)
+    if start is not None:
+        query = query.where(table.c.timestamp >= to_datetime(start))
+    if end is not None:
+        query = query.where(table.c.timestamp < to_datetime(end))
+    if cursor is not None:
+        # Keyset pagination: resume strictly after the last row of the previous page
+        after_ts, after_id = decode_cursor(cursor)
+        query = query.where(or_(table.c.timestamp > after_ts,
+                                and_(table.c.timestamp == after_ts, table.c.id > after_id)))
+    query = query.order_by(table.c.timestamp, table.c.id).execution_options(yield_per=FETCH_SIZE)
+    return db.session.execute(query)
+
+
+def every_nth(rows, n):
+    """Keep every nth sample
+
+    A kept row's page boundary is the last row skipped after it, so the next page
+    starts exactly on the following stride instead of one row past the kept sample."""
+    kept = last = None
+    for i, row in enumerate(rows):
+        if i % n == 0:
+            if kept is not None:
+                yield kept, last
+            kept = row
+        last = row
+    if kept is not None:
+        yield kept, last
+
+
+def min_max_buckets(rows, bucket_seconds, field='elevation'):
+    """Keep the min and max sample of field in each time bucket, in time order
+
+    Yields (row, last_row_of_bucket) so pagination resumes after the whole bucket."""
+    bucket = None
+    lowest = highest = last = None
+    for row in rows:
+        key = int((row.timestamp - EPOCH).total_seconds() // bucket_seconds)
+        if key != bucket and last is not None:
+            yield from _bucket_extremes(lowest, highest, last)
+            lowest = highest = None
+        bucket = key
+        value = getattr(row, field)
+        if lowest is None or value < getattr(lowest, field):
+            lowest = row
+        if highest is None or value > getattr(highest, field):
+            highest = row
+        last = row
+    if last is not None:
+        yield from _bucket_extremes(lowest, highest, last)
+
+
+def _bucket_extremes(lowest, highest, last):
+    extremes = sorted({lowest.id: lowest, highest.id: highest}.values(), key=lambda r: (r.timestamp, r.id))
+    # Only the final row of a bucket may close a page, otherwise the next page would split the bucket
+    for row in extremes[:-1]:
+        yield row, None
+    yield extremes[-1], last
+
+
+def paginate(samples, limit):
+    """Take about limit samples and work out the cursor for the next page (None when done)
+
+    samples yields (row, boundary) pairs; a page can only end on a row whose boundary
+    is set, and the next page resumes after that boundary row."""
+    state = {'next_cursor': None}
+
+    def rows():
+        count = 0
+        boundary = None
+        for row, next_boundary in samples:
+            if count >= limit and boundary is not None:
+                state['next_cursor'] = encode_cursor(boundary)
+                return
+            boundary = next_boundary
+            count += 1
+            yield row
+    return rows(), state
+
+
+def row_to_dict(row):
+    record = {name: getattr(row, name) for name in COLUMNS}
+    record['timestamp'] = row.timestamp.isoformat()
+    return record
+
+
+def stream_json(data_id, rows, state):
+    """Encode rows as one JSON document, written out piece by piece"""
+    yield f'{{"data_id": {data_id}, "positions": ['
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + json.dumps(row_to_dict(row))
+    yield f'], "next_cursor": {json.dumps(state["next_cursor"])}}}'
+
+
+def stream_ndjson(data_id, rows, state):
+    """One JSON object per line, closed by a line holding only the next cursor"""
+    for row in rows:
+        yield json.dumps(row_to_dict(row)) + '\n'
+    yield json.dumps({'data_id': data_id, 'next_cursor': state['next_cursor']}) + '\n'
@@ -0,0 +1,106 @@
+'''Bulk ingestion of position samples into the Positions table'''
+'''Rows are written with Core executemany inserts in batches inside one transaction,
+instead of one ORM object and one commit per sample'''
+
+from datetime import datetime, timezone
+from itertools import islice
+
+import numpy as np
+
+from database import db
+from models import Data, Positions
+
+POSITION_FIELDS = ('satlatitude', 'satlongitude', 'sataltitude', 'azimuth', 'elevation', 'ra', 'dec')
+BATCH_SIZE = 10000
+
+
+def to_datetime(value):
+    """Timestamps may be datetimes, ISO 8601 strings, numpy datetime64 or unix seconds"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return to_datetime(float(value))
+        except ValueError:
+            pass
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+    if isinstance(value, np.datetime64):
+        value = value.astype('datetime64[us]').astype(np.int64) / 1e6
+    return datetime.fromtimestamp(float(value), tz=timezone.utc).replace(tzinfo=None)
+
+
+def _columnar_rows(columns, data_id, title):
+    """Rows from a mapping of equal-length arrays (dict of arrays or a structured array)"""
+    names = columns.dtype.names if isinstance(columns, np.ndarray) else columns.keys()
+    missing = [field for field in POSITION_FIELDS if field not in names]
+    if missing:
+        raise ValueError(f'Missing position fields: {", ".join(missing)}')
+    # tolist() turns each column into plain Python floats in one pass, much faster than per-element access
+    values = [np.asarray(columns[field], dtype=np.float64).tolist() for field in POSITION_FIELDS]
+    if 'timestamp' in names:
+        timestamps = np.asarray(columns['timestamp'])
+        if np.issubdtype(timestamps.dtype, np.datetime64):
+            timestamps = timestamps.astype('datetime64[us]').astype(np.int64) / 1e6
+        values.append(timestamps)
+    else:
+        now = datetime.utcnow()
+        values.append([now] * len(values[0]))
+    # zip() would silently drop the tail of the longer columns
+    lengths = {field: len(column) for field, column in zip(POSITION_FIELDS + ('timestamp',), values)}
+    if len(set(lengths.values())) > 1:
+        raise ValueError(f'Position columns differ in length: {lengths}')
+    for row in zip(*values):
+        record = dict(zip(POSITION_FIELDS, row))
+        record['timestamp'] = to_datetime(row[-1])
+        record['data_id'] = data_id
+        record['title'] = title
+        yield record
+
+
+def _stream_rows(samples, data_id, title):
+    """Rows from an iterable of dicts or of tuples ordered as POSITION_FIELDS + (timestamp,)"""
+    for sample in samples:
+        if isinstance(sample, dict):
+            record = {field: float(sample[field]) for field in POSITION_FIELDS}
+            timestamp = sample.get('timestamp')
+        else:
+            record = dict(zip(POSITION_FIELDS, map(float, sample[:len(POSITION_FIELDS)])))
+            timestamp = sample[len(POSITION_FIELDS)] if len(sample) > len(POSITION_FIELDS) else None
+        record['timestamp'] = to_datetime(timestamp) if timestamp is not None else datetime.utcnow()
+        record['data_id'] = data_id
+        record['title'] = title
+        yield record
+
+
+def bulk_insert_positions(data_id, samples, title=None, batch_size=BATCH_SIZE):
+    """Insert position samples for one Data row, returns the number of rows written
+
+    samples may be a dict of NumPy arrays / lists keyed by field name, a NumPy
+    structured array, or any iterable (including a generator) of dicts or tuples.
+    Everything goes in as one transaction; nothing is written if a batch fails."""
+    if title is None:
+        data = db.session.get(Data, data_id)
+        if data is None:
+            raise ValueError(f'Data {data_id} not found')
+        title = data.title
+
+    if isinstance(samples, dict) or (isinstance(samples, np.ndarray) and samples.dtype.names):
+        rows = _columnar_rows(samples, data_id, title)
+    else:
+        rows = _stream_rows(samples, data_id, title)
+
+    insert = Positions.__table__.insert()
+    written = 0
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            db.session.execute(insert, batch)
+            written += len(batch)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return written
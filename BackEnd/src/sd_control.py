@@ -1,60 +1,163 @@
+import codecs
+import logging
+import os
+import re
 import subprocess
+import time
+from collections import deque
 
-def offline_process():
+logger = logging.getLogger(__name__)
+
+#Own process group/session so a cancelled job can kill satdump and not just the shell
+if os.name == 'nt':
+    PROCESS_GROUP = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    PROCESS_GROUP = {'start_new_session': True}
+
+#SatDump log lines look like
+#[14:02:11 - 08/04/2024] (I) Progress 45.2%, SNR : 7.81dB, Peak SNR: 9.90dB
+#[14:02:11 - 08/04/2024] (I) Progress 45.2%, Viterbi : SYNCED BER : 0.012, Deframer : SYNCED, Frames : 1532
+PROGRESS_PATTERNS = {
+    'percent': re.compile(r'Progress\s*:?\s*(-?[\d.]+)\s*%'),
+    'snr': re.compile(r'(?<!Peak )SNR\s*:\s*(-?[\d.]+)\s*dB'),
+    'peak_snr': re.compile(r'Peak SNR\s*:\s*(-?[\d.]+)\s*dB'),
+    'ber': re.compile(r'BER\s*:\s*([\d.]+)'),
+    'frames': re.compile(r'Frames\s*:\s*(\d+)|(\d+)\s+frames', re.IGNORECASE),
+}
+LOCK_PATTERN = re.compile(r'(Deframer|Viterbi|Demodulator|Sync)\s*:\s*(SYNCED|NOSYNC|SYNCING)', re.IGNORECASE)
+LEVEL_PATTERN = re.compile(r'\(([DIWEC])\)')
+LOG_TAIL = 200
+READ_CHUNK = 4096
+LINE_BREAK = re.compile(r'[\r\n]')
+MIN_CAPTURE_SECONDS = 10
+
+def parse_progress(line):
+    #Pull whatever progress fields a SatDump log line has, None if it has none
+    event = {}
+    for name, pattern in PROGRESS_PATTERNS.items():
+        match = pattern.search(line)
+        if match:
+            value = next(group for group in match.groups() if group is not None)
+            event[name] = int(value) if name == 'frames' else float(value)
+    locks = LOCK_PATTERN.findall(line)
+    if locks:
+        sync = {stage.lower(): state.upper() for stage, state in locks}
+        #The deframer is the last stage, so its state is what decides whether frames come out
+        event['lock'] = sync['deframer'] == 'SYNCED' if 'deframer' in sync else 'SYNCED' in sync.values()
+        event['sync'] = sync
+    if not event:
+        return None
+    level = LEVEL_PATTERN.search(line)
+    event['level'] = level.group(1) if level else None
+    event['time'] = time.time()
+    return event
+
+def output_lines(stream):
+    #Yield lines as soon as they end, splitting on carriage returns too. Progress bars
+    #redraw with a bare \r and readline() would hold every redraw until the next \n
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ''
+    for chunk in iter(lambda: stream.read1(READ_CHUNK), b''):
+        pending += decoder.decode(chunk)
+        *lines, pending = LINE_BREAK.split(pending)
+        yield from lines
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+def run_satdump(p, job=None):
+    #Hand the process to the job (if any) so it can be cancelled or timed out, then read
+    #its output as it arrives instead of buffering all of it until exit
+    if job is not None:
+        job.attach_process(p)
+    tail = deque(maxlen=LOG_TAIL)
+    for line in output_lines(p.stdout):
+        line = line.strip()
+        if not line:
+            continue
+        tail.append(line)
+        event = parse_progress(line)
+        if job is not None:
+            job.log(line)
+            if event is not None:
+                job.report_progress(event)
+    p.stdout.close()
+    p.wait()
+    if p.returncode == 0:
+        logger.info("SatDump finished")
+    else:
+        logger.error("SatDump exited with %s:\n%s", p.returncode, "\n".join(tail))
+    return p.returncode
+
+def offline_process(job=None):
     p = subprocess.Popen('satdump meteor_hrpt cadu "C:/Users/Justin Isa/Downloads/crosswalkersam_meteor_hrpt_2022_04_08_14_14_42.cadu" "C:/Users/Justin Isa/Desktop/SatDumpTest" --samplerate 3000000',
         stdin = subprocess.PIPE,
         stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE,
-        shell = True)
-    
-    output, error = p.communicate()
-    if p.returncode == 0:
-        print("Success")
-    else:
-        print("Error: ", error)
-        print("Output: ", output)
+        stderr = subprocess.STDOUT,
+        shell = True,
+        **PROCESS_GROUP)
 
-def live_process():
+    return run_satdump(p, job)
+
+def live_process(job=None):
     #the commented code is for the cadu format meteor satellite
     '''p = subprocess.Popen('satdump live cadu "C:/Users/Justin Isa/Desktop/SatDumpTest" --source rtlsdr --frequency 1700e6 --samplerate 3e6 --gain 40 --http_server 0.0.0.0:3000',
     stdin = subprocess.PIPE,
         stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE,
+        stderr = subprocess.STDOUT,
         shell = True)'''
 
     #this code is test code for the file, records regular fm radio
     p = subprocess.Popen('satdump live generic_analog_demod "C:/Users/Justin Isa/Desktop/SatDumpOutputs" --source rtlsdr --frequency 100.7e6 --samplerate 2.4e6 --gain 30 --timeout 30',
         stdin = subprocess.PIPE,
         stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE,
-        shell = True)
+        stderr = subprocess.STDOUT,
+        shell = True,
+        **PROCESS_GROUP)
 
+    return run_satdump(p, job)
 
-    output, error = p.communicate()
-    if p.returncode == 0:
-        print("Success")
-    else:
-        print("Error: ", error)
-        print("Output: ", output)
-
-def record_process():
+def record_process(job=None):
     #the commented code is for the cadu format meteor satellite
     '''p = subprocess.Popen('satdump record cadu "C:/Users/Justin Isa/Desktop/SatDumpTest" --source rtlsdr --frequency 1700e6 --samplerate 3e6 --gain 40',
             stdin = subprocess.PIPE,
         stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE,
+        stderr = subprocess.STDOUT,
         shell = True)'''
     
     #this code is test code for the file, records regular fm radio    
     p = subprocess.Popen('satdump record record_testing  --source rtlsdr --frequency 100.7e6 --samplerate 2e6 --gain 30 --timeout 30 --baseband_format w16',
         stdin = subprocess.PIPE,
         stdout = subprocess.PIPE,
-        stderr = subprocess.PIPE,
-        shell = True)
+        stderr = subprocess.STDOUT,
+        shell = True,
+        **PROCESS_GROUP)
 
-    output, error = p.communicate()
-    if p.returncode == 0:
-        print("Success")
+    return run_satdump(p, job)
+
+def capture_command(mode, output, frequency, samplerate, gain, duration, pipeline=None, baseband_format='w16'):
+    #Builds the satdump record/live command for a scheduled capture, duration is in seconds
+    if mode == 'record':
+        command = f'satdump record "{output}" --baseband_format {baseband_format}'
+    elif mode == 'live':
+        command = f'satdump live {pipeline} "{output}"'
     else:
-        print("Error: ", error)
-        print("Output: ", output)
+        raise ValueError(f'Unknown capture mode {mode}')
+    return f'{command} --source rtlsdr --frequency {frequency:.0f} --samplerate {samplerate:.0f} --gain {gain:g} --timeout {int(duration)}'
+
+def capture_process(job=None, los=None, **capture):
+    #Scheduled capture, see capture_command for the keyword arguments. With los (unix time)
+    #the duration is worked out when the job actually starts, so a capture that waited in
+    #the queue for the SDR still stops at LOS
+    if los is not None:
+        capture['duration'] = los - time.time()
+        if capture['duration'] < MIN_CAPTURE_SECONDS:
+            raise RuntimeError(f'only {max(0, int(capture["duration"]))} s of the pass left, capture skipped')
+    p = subprocess.Popen(capture_command(**capture),
+        stdin = subprocess.PIPE,
+        stdout = subprocess.PIPE,
+        stderr = subprocess.STDOUT,
+        shell = True,
+        **PROCESS_GROUP)
+
+    return run_satdump(p, job)
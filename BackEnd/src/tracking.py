@@ -0,0 +1,406 @@
+'''Real-time antenna pointing'''
+'''A pass's az/el track is turned into rotator setpoints once, up front: azimuth is
+unwrapped and shifted into the rotator's travel range, high passes go over the top in
+flip mode (when the rotator allows it and that points better) and otherwise the zenith
+keyhole is handled with a rate-limited slew centred on the crossing, all resampled at
+the control rate. The loop itself only indexes
+into that table and talks to the rotator backend (rotctld over TCP, GS-232 serial, or a
+local simulator)'''
+
+import math
+import socket
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+DEFAULT_RATE = 20.0  # Hz
+FEEDBACK_EVERY = 5  # read the rotator position every N ticks
+STATS_WINDOW = 2000
+FLIP_MIN_ELEVATION = 60.0  # lower passes never need to go over the top
+
+
+class RotatorLimits:
+    def __init__(self, az_min=0.0, az_max=360.0, el_min=0.0, el_max=90.0, az_speed=6.0, el_speed=6.0):
+        self.az_min = az_min
+        self.az_max = az_max
+        self.el_min = el_min
+        self.el_max = el_max  # 180 means the rotator can flip over the top
+        self.az_speed = az_speed  # degrees per second
+        self.el_speed = el_speed
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+class Trajectory:
+    """Rotator setpoints for one pass, sampled at a fixed rate
+
+    times are unix seconds. az/el are the true look angles; cmd_az/cmd_el are what
+    the rotator is told, in its own coordinates (unwrapped, possibly flipped)."""
+
+    def __init__(self, times, az, el, limits, rate=DEFAULT_RATE):
+        times = np.asarray(times, dtype=np.float64)
+        order = np.argsort(times)
+        times, az, el = times[order], np.asarray(az, dtype=np.float64)[order], np.asarray(el, dtype=np.float64)[order]
+        if len(times) < 2:
+            raise ValueError('A trajectory needs at least two samples')
+
+        self.limits = limits
+        self.rate = rate
+        self.start = times[0]
+        self.end = times[-1]
+        self.times = np.arange(times[0], times[-1], 1.0 / rate)
+        # Interpolate on the unwrapped azimuth so a track crossing north does not sweep through 180
+        unwrapped = np.degrees(np.unwrap(np.radians(az)))
+        self.az = np.mod(np.interp(self.times, times, unwrapped), 360.0)
+        self.el = np.interp(self.times, times, el)
+
+        cmd_az = self._rate_limit(self._fit_azimuth(np.interp(self.times, times, unwrapped)), limits.az_speed)
+        self.cmd_az = np.clip(cmd_az, limits.az_min, limits.az_max)
+        self.cmd_el = np.clip(self.el, limits.el_min, limits.el_max)
+        self.flipped = False
+        if limits.el_max >= 180.0 and self.el.max() >= FLIP_MIN_ELEVATION:
+            # Decided for the whole pass: flip only when it points better than the rate-limited direct form
+            flip_az, flip_el = self._flip()
+            flip_az = np.clip(self._fit_azimuth(flip_az), limits.az_min, limits.az_max)
+            flip_el = np.clip(flip_el, limits.el_min, limits.el_max)
+            if pointing_errors(self.az, self.el, flip_az, flip_el).max() < \
+                    pointing_errors(self.az, self.el, self.cmd_az, self.cmd_el).max():
+                self.cmd_az, self.cmd_el = flip_az, flip_el
+                self.flipped = True
+
+    def _flip(self):
+        """Flip mode for rotators with 180 degrees of elevation: the azimuth is parked on
+        the vertical plane that best fits the pass and the elevation alone follows the
+        satellite from 0 at AOS, over the top, to 180 at LOS. The swing a high pass needs
+        in azimuth near the zenith never happens; the cost is the pass's distance from that
+        plane, which for an overhead pass is about 90 minus its max elevation"""
+        look = look_vectors(self.az, self.el)
+        horizontal = look[:, :2]
+        # The plane's normal is the horizontal direction the pass strays along the least
+        _, vectors = np.linalg.eigh(horizontal.T @ horizontal)
+        normal = vectors[:, 0]
+        axis = np.array([-normal[1], normal[0]])
+        if horizontal[0] @ axis < 0:
+            axis = -axis  # elevation 0 looks toward AOS
+        axis_az = math.degrees(math.atan2(axis[0], axis[1])) % 360.0
+        cmd_el = np.degrees(np.arctan2(look[:, 2], horizontal @ axis))
+        return np.full_like(self.el, axis_az), cmd_el
+
+    def _fit_azimuth(self, az):
+        """Shift the whole path by a multiple of 360 so it stays inside the rotator's travel,
+        preferring the shift closest to the middle of the range"""
+        limits = self.limits
+        middle = (limits.az_min + limits.az_max) / 2.0
+        best = None
+        for k in range(-2, 3):
+            shifted = az + 360.0 * k
+            if shifted.min() >= limits.az_min - 1e-6 and shifted.max() <= limits.az_max + 1e-6:
+                score = abs((shifted.min() + shifted.max()) / 2.0 - middle)
+                if best is None or score < best[0]:
+                    best = (score, shifted)
+        if best is not None:
+            return best[1]
+        # Path cannot fit (e.g. crosses the stop on a 0-360 rotator): wrap into range
+        # and let the rotator unwind once at the crossing
+        return limits.az_min + np.mod(az - limits.az_min, 360.0)
+
+    def _rate_limit(self, az, speed):
+        """Keyhole handling: cap azimuth speed at what the rotator can do, with the slew
+        centred on the zenith crossing so the antenna leads by half of it and lags by
+        the other half
+
+        Averaging a path that slews early (backward pass) with one that slews late
+        (forward pass), each allowed twice the speed, gives a slew at full speed centred
+        on the crossing. Whatever averaging left too fast is trimmed at the real speed
+        both ways round and averaged again, which keeps the cap and the centring."""
+        # Leave real wraps (jumps larger than a normal slew) alone
+        if (np.abs(np.diff(az)) > 180.0).any():
+            return az
+        lead = limit_backward(az.tolist(), 2.0 * speed / self.rate)
+        lag = limit_forward(az.tolist(), 2.0 * speed / self.rate)
+        centred = [(a + b) / 2.0 for a, b in zip(lead, lag)]
+        step = speed / self.rate
+        early = limit_forward(limit_backward(list(centred), step), step)
+        late = limit_backward(limit_forward(list(centred), step), step)
+        return (np.array(early) + np.array(late)) / 2.0
+
+    def index_at(self, t):
+        i = int((t - self.start) * self.rate)
+        return min(max(i, 0), len(self.times) - 1)
+
+    def setpoint(self, t):
+        i = self.index_at(t)
+        return self.cmd_az[i], self.cmd_el[i]
+
+    def true_position(self, t):
+        i = self.index_at(t)
+        return self.az[i], self.el[i]
+
+    def to_dict(self):
+        return {'start': self.start, 'end': self.end, 'rate': self.rate, 'samples': len(self.times),
+                'flipped': self.flipped, 'max_el': float(self.el.max())}
+
+
+def limit_backward(values, step):
+    """Cap the change between neighbours at step, moving earlier samples toward later ones"""
+    for i in range(len(values) - 2, -1, -1):
+        values[i] = min(max(values[i], values[i + 1] - step), values[i + 1] + step)
+    return values
+
+
+def limit_forward(values, step):
+    """Cap the change between neighbours at step, moving later samples toward earlier ones"""
+    for i in range(1, len(values)):
+        values[i] = min(max(values[i], values[i - 1] - step), values[i - 1] + step)
+    return values
+
+
+def look_vectors(az, el):
+    """(east, north, up) unit vectors for arrays of look angles in degrees"""
+    az, el = np.radians(az), np.radians(el)
+    return np.stack([np.cos(el) * np.sin(az), np.cos(el) * np.cos(az), np.sin(el)], axis=-1)
+
+
+def pointing_errors(true_az, true_el, cmd_az, cmd_el):
+    """Great-circle angles (degrees) between true directions and rotator setpoints,
+    flip mode included (el past 90 points backwards over the top)"""
+    over = cmd_el > 90.0
+    look_az = np.where(over, cmd_az + 180.0, cmd_az)
+    look_el = np.where(over, 180.0 - cmd_el, cmd_el)
+    dots = np.sum(look_vectors(true_az, true_el) * look_vectors(look_az, look_el), axis=-1)
+    return np.degrees(np.arccos(np.clip(dots, -1.0, 1.0)))
+
+
+def rotator_to_look(az, el):
+    """Undo flip mode: rotator (az, el) with el past 90 back to a true look direction"""
+    if el > 90.0:
+        return (az + 180.0) % 360.0, 180.0 - el
+    return az % 360.0, el
+
+
+def angular_error(az1, el1, az2, el2):
+    """Great-circle angle (degrees) between two look directions"""
+    e1, e2 = math.radians(el1), math.radians(el2)
+    d = math.radians(az1 - az2)
+    c = math.sin(e1) * math.sin(e2) + math.cos(e1) * math.cos(e2) * math.cos(d)
+    return math.degrees(math.acos(max(-1.0, min(1.0, c))))
+
+
+class RotatorBackend:
+    """Interface for rotator backends; positions are in rotator coordinates"""
+
+    def set_position(self, az, el):
+        raise NotImplementedError
+
+    def get_position(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RotctldBackend(RotatorBackend):
+    """Hamlib rotctld network protocol ('P az el' / 'p')"""
+
+    def __init__(self, host='localhost', port=4533, timeout=1.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('r')
+
+    def set_position(self, az, el):
+        self.sock.sendall(f'P {az:.2f} {el:.2f}\n'.encode())
+        reply = self.reader.readline().strip()
+        if reply != 'RPRT 0':
+            raise IOError(f'rotctld rejected position: {reply}')
+
+    def get_position(self):
+        self.sock.sendall(b'p\n')
+        az = float(self.reader.readline())
+        el = float(self.reader.readline())
+        return az, el
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class SerialBackend(RotatorBackend):
+    """Yaesu GS-232 compatible controller on a serial port (needs pyserial)"""
+
+    def __init__(self, port, baudrate=9600, timeout=1.0):
+        try:
+            import serial
+        except ImportError:
+            raise RuntimeError('pyserial is required for the serial rotator backend')
+        self.port = serial.Serial(port, baudrate=baudrate, timeout=timeout)
+
+    def set_position(self, az, el):
+        # GS-232 only takes whole degrees in 0-450 / 0-180
+        self.port.write(f'W{int(round(az)) % 450:03d} {int(round(el)):03d}\r'.encode())
+
+    def get_position(self):
+        self.port.reset_input_buffer()
+        self.port.write(b'C2\r')
+        reply = self.port.read_until(b'\r').decode(errors='replace')
+        # Reply looks like "+0123+0045" (AZ=123 EL=45 on some firmware)
+        digits = [int(part) for part in reply.replace('AZ=', '+').replace('EL=', '+').split('+') if part.strip().isdigit()]
+        if len(digits) < 2:
+            raise IOError(f'Unexpected GS-232 reply: {reply!r}')
+        return float(digits[0]), float(digits[1])
+
+    def close(self):
+        self.port.close()
+
+
+class SimulatorBackend(RotatorBackend):
+    """Rotator model that slews toward the last setpoint at a fixed speed, for offline testing"""
+
+    def __init__(self, limits=None, az=0.0, el=0.0, clock=time.monotonic):
+        self.limits = limits or RotatorLimits()
+        self.az = az
+        self.el = el
+        self.target = (az, el)
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _advance(self):
+        now = self.clock()
+        dt = now - self.updated
+        self.updated = now
+        target_az, target_el = self.target
+        self.az += max(-self.limits.az_speed * dt, min(self.limits.az_speed * dt, target_az - self.az))
+        self.el += max(-self.limits.el_speed * dt, min(self.limits.el_speed * dt, target_el - self.el))
+
+    def set_position(self, az, el):
+        with self.lock:
+            self._advance()
+            self.target = (az, el)
+
+    def get_position(self):
+        with self.lock:
+            self._advance()
+            return self.az, self.el
+
+
+class RunningStats:
+    """Count, mean, max and p95 over a bounded window of samples"""
+
+    def __init__(self, window=STATS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        if not self.samples:
+            return {'count': 0}
+        values = np.fromiter(self.samples, dtype=np.float64)
+        return {'count': self.count, 'mean': float(values.mean()),
+                'p95': float(np.percentile(values, 95)), 'max': self.max}
+
+
+class TrackingLoop:
+    """Sends trajectory setpoints to a backend at the trajectory's rate on its own thread
+
+    Wake-ups are scheduled against absolute deadlines so the loop does not drift, and
+    the setpoint is looked up from the wall clock so a late tick still commands the
+    right position. time_offset shifts the trajectory in time (e.g. to replay a stored
+    pass as if it were happening now)."""
+
+    def __init__(self, trajectory, backend, time_offset=0.0, feedback_every=FEEDBACK_EVERY):
+        self.trajectory = trajectory
+        self.backend = backend
+        self.time_offset = time_offset
+        self.feedback_every = feedback_every
+        self.jitter = RunningStats()  # ms between the deadline and the actual wake-up
+        self.command_latency = RunningStats()  # ms to send a setpoint
+        self.tracking_error = RunningStats()  # degrees between true direction and reported position
+        self.missed_deadlines = 0
+        self.ticks = 0
+        self.last_setpoint = None
+        self.last_position = None
+        self.error = None
+        self.state = 'idle'
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.state = 'waiting'
+        self.thread = threading.Thread(target=self._run, name='tracking-loop', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+
+    def _now(self):
+        return time.time() - self.time_offset
+
+    def _run(self):
+        period = 1.0 / self.trajectory.rate
+        try:
+            # Pre-position at the first setpoint (AOS, or now if the pass is under way)
+            self.backend.set_position(*self.trajectory.setpoint(max(self._now(), self.trajectory.start)))
+            wait = self.trajectory.start - self._now()
+            if wait > 0 and self.stop_event.wait(wait):
+                return
+            self.state = 'tracking'
+            deadline = time.perf_counter()
+            while not self.stop_event.is_set():
+                now = self._now()
+                if now > self.trajectory.end:
+                    break
+                self._tick(now)
+                deadline += period
+                delay = deadline - time.perf_counter()
+                if delay > 0:
+                    self.stop_event.wait(delay)
+                else:
+                    # Fell behind: skip the ticks we missed instead of bursting to catch up
+                    missed = int(-delay // period) + 1
+                    self.missed_deadlines += missed
+                    deadline += missed * period
+                self.jitter.add(max(0.0, time.perf_counter() - deadline) * 1000)
+        except Exception as e:
+            self.error = str(e)
+            self.state = 'error'
+            return
+        finally:
+            self.backend.close()
+        self.state = 'stopped' if self.stop_event.is_set() else 'done'
+
+    def _tick(self, now):
+        az, el = self.trajectory.setpoint(now)
+        t0 = time.perf_counter()
+        self.backend.set_position(az, el)
+        self.command_latency.add((time.perf_counter() - t0) * 1000)
+        self.last_setpoint = (float(az), float(el))
+        self.ticks += 1
+        if self.ticks % self.feedback_every == 0:
+            position = self.backend.get_position()
+            self.last_position = position
+            true_az, true_el = self.trajectory.true_position(now)
+            self.tracking_error.add(angular_error(true_az, true_el, *rotator_to_look(*position)))
+
+    def status(self):
+        return {
+            'state': self.state,
+            'error': self.error,
+            'trajectory': self.trajectory.to_dict(),
+            'ticks': self.ticks,
+            'missed_deadlines': self.missed_deadlines,
+            'last_setpoint': self.last_setpoint,
+            'last_position': self.last_position,
+            'jitter_ms': self.jitter.to_dict(),
+            'command_latency_ms': self.command_latency.to_dict(),
+            'tracking_error_deg': self.tracking_error.to_dict(),
+        }
@@ -0,0 +1,20 @@
+'''Regression tests for the pass-driven capture scheduler'''
+'''Run from BackEnd/: python -m pytest tests'''
+
+from src.capture_scheduler import CaptureScheduler, DRY_RUN
+
+
+def noaa15_response(aos, los):
+    return {'info': {'satid': 25338, 'satname': 'NOAA 15'},
+            'passes': [{'startUTC': aos, 'endUTC': los, 'maxEl': 40.0}]}
+
+
+def test_reposted_prediction_fires_once():
+    scheduler = CaptureScheduler(None, dry_run=True, clock=lambda: 1000.0)
+    scheduler.add_passes([noaa15_response(2000, 2600)])
+    scheduler.add_passes([noaa15_response(2000, 2600)])
+
+    fired = scheduler.simulate(until=3000)
+
+    assert [p.id for p in fired] == ['25338-2000']
+    assert [p.state for p in fired] == [DRY_RUN]
@@ -0,0 +1,41 @@
+'''Tests for the SatDump job pool'''
+'''Run from BackEnd/: python -m pytest tests'''
+
+import threading
+import time
+
+from src.job_manager import JobManager, DONE
+
+
+def block(job, release, n):
+    release.wait(5)
+
+
+def test_device_job_does_not_wait_behind_cpu_jobs():
+    jobs = JobManager(workers=2, device_workers=1)
+    release = threading.Event()
+    started = threading.Event()
+    try:
+        for i in range(3):
+            jobs.submit('offline', block, release=release, n=i)
+        jobs.submit('capture', lambda job: started.set(), device='rtlsdr')
+
+        assert started.wait(2)
+    finally:
+        release.set()
+
+
+def test_device_jobs_go_ahead_of_queued_cpu_jobs():
+    jobs = JobManager(workers=1, device_workers=0)
+    release = threading.Event()
+    order = []
+    jobs.submit('offline', block, release=release, n=0)
+    jobs.submit('offline', lambda job: order.append('offline'))
+    last, _ = jobs.submit('capture', lambda job: order.append('capture'), device='rtlsdr')
+    release.set()
+
+    for _ in range(200):
+        if last.state == DONE and len(order) == 2:
+            break
+        time.sleep(0.01)
+    assert order == ['capture', 'offline']
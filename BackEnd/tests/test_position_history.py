@@ -0,0 +1,71 @@
+'''Regression tests for position history downsampling and pagination'''
+'''Run from BackEnd/: python -m pytest tests'''
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from flask import Flask
+
+from database import db, init_db
+from models import Data
+from src.position_history import decode_cursor, every_nth, iter_positions, paginate
+from src.positions_ingest import POSITION_FIELDS, bulk_insert_positions
+
+Row = namedtuple('Row', 'id timestamp')
+START = datetime(2024, 1, 1)
+
+
+def page(rows, n, limit, cursor=None):
+    if cursor is not None:
+        after_ts, after_id = decode_cursor(cursor)
+        rows = [r for r in rows if (r.timestamp, r.id) > (after_ts, after_id)]
+    kept, state = paginate(every_nth(rows, n), limit)
+    return [r.id for r in kept], state['next_cursor']
+
+
+def test_every_nth_keeps_stride_across_pages():
+    rows = [Row(i, START + timedelta(seconds=i)) for i in range(100)]
+    pages, cursor = [], None
+    while True:
+        ids, cursor = page(rows, 10, 3, cursor)
+        pages.append(ids)
+        if cursor is None:
+            break
+    assert pages == [[0, 10, 20], [30, 40, 50], [60, 70, 80], [90]]
+
+
+@pytest.fixture
+def capture(tmp_path):
+    """A throwaway SQLite database holding one capture of 100 positions, two per second"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "positions.db"}'
+    init_db(app)
+    with app.app_context():
+        data = Data(title='test', filepath='test', satellite='TEST')
+        db.session.add(data)
+        db.session.commit()
+        track = {field: np.zeros(100) for field in POSITION_FIELDS}
+        track['elevation'] = np.arange(100, dtype=np.float64)
+        # Shared timestamps make the keyset cursor fall back to the id tiebreak
+        track['timestamp'] = 1.7e9 + np.arange(100) // 2
+        bulk_insert_positions(data.id, track)
+        yield data.id
+
+
+def test_every_nth_pages_through_the_database(capture):
+    pages, cursor = [], None
+    while True:
+        kept, state = paginate(every_nth(iter_positions(capture, cursor=cursor), 10), 3)
+        pages.append([row.elevation for row in kept])
+        cursor = state['next_cursor']
+        if cursor is None:
+            break
+    assert pages == [[0, 10, 20], [30, 40, 50], [60, 70, 80], [90]]
+
+
+@pytest.mark.parametrize('arguments', [{'cursor': 'not-a-cursor'}, {'start': 'yesterday'}, {'end': 'soon'}])
+def test_malformed_arguments_raise_value_error(capture, arguments):
+    with pytest.raises(ValueError):
+        iter_positions(capture, **arguments)
@@ -0,0 +1,49 @@
+'''Tests for the pass trajectory planner'''
+'''Run from BackEnd/: python -m pytest tests'''
+
+import numpy as np
+
+from src.tracking import RotatorLimits, Trajectory, pointing_errors
+
+
+def straight_pass(max_el, duration=600.0, samples=1201):
+    """A great circle from horizon to horizon, tilted off the zenith so it peaks at max_el"""
+    tilt = np.radians(90.0 - max_el)
+    theta = np.linspace(0.0, np.pi, samples)
+    # east to west through (nearly) the zenith, leaning south so the azimuth never crosses the 0/360 stop
+    east = np.cos(theta)
+    north = -np.sin(theta) * np.sin(tilt)
+    up = np.sin(theta) * np.cos(tilt)
+    az = np.degrees(np.arctan2(east, north)) % 360.0
+    el = np.degrees(np.arcsin(np.clip(up, -1.0, 1.0)))
+    return np.linspace(0.0, duration, samples), az, el
+
+
+def test_near_zenith_pass_flips_over_the_top():
+    times, az, el = straight_pass(89.4)
+    trajectory = Trajectory(times, az, el, RotatorLimits(el_max=180.0))
+
+    assert trajectory.flipped
+    assert trajectory.cmd_el.max() > 90.0
+    errors = pointing_errors(trajectory.az, trajectory.el, trajectory.cmd_az, trajectory.cmd_el)
+    assert errors.max() < 1.0
+
+
+def test_low_pass_is_not_flipped():
+    times, az, el = straight_pass(40.0)
+    trajectory = Trajectory(times, az, el, RotatorLimits(el_max=180.0))
+
+    assert not trajectory.flipped
+    assert trajectory.cmd_el.max() <= 90.0
+
+
+def test_keyhole_slew_is_centred_on_the_peak():
+    times, az, el = straight_pass(89.4)
+    trajectory = Trajectory(times, az, el, RotatorLimits(el_max=90.0, az_speed=6.0))
+
+    peak = int(np.argmax(trajectory.el))
+    start, end = trajectory.cmd_az[0], trajectory.cmd_az[-1]
+    halfway = int(np.argmin(np.abs(trajectory.cmd_az - (start + end) / 2.0)))
+    assert abs(halfway - peak) <= trajectory.rate  # within a second of the crossing
+    steps = np.abs(np.diff(trajectory.cmd_az)) * trajectory.rate
+    assert steps.max() <= 6.0 + 1e-6
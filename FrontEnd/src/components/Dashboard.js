@@ -12,8 +12,15 @@ const Dashboard = () => {
     satellites: 0 
   });
 
-  // Fetch system status from existing backend endpoints
+  // Fetch system status once, then follow backend events instead of polling
   useEffect(() => {
+    let hasSatelliteData = false;
+    // Jobs currently queued or running on the backend, keyed by job id
+    const activeJobs = {};
+
+    const isTracking = () =>
+      hasSatelliteData || Object.values(activeJobs).some(job => job.state === 'running' && job.device);
+
     const fetchSystemStatus = async () => {
       try {
         // Check if backend is responding
@@ -24,7 +31,6 @@ const Dashboard = () => {
         const backendResponding = response.ok;
         
         // Try to get satellite data, but don't fail if it doesn't exist
-        let hasSatelliteData = false;
         try {
           const satelliteResponse = await fetch('http://localhost:5000/1');
           const satelliteData = await satelliteResponse.json();
@@ -37,7 +43,7 @@ const Dashboard = () => {
         // Set status based on backend availability
         setSystemStatus({
           antenna: backendResponding ? 'Connected' : 'Disconnected',
-          tracking: hasSatelliteData ? 'Active' : 'Inactive', 
+          tracking: isTracking() ? 'Active' : 'Inactive', 
           signal: backendResponding ? 'Strong' : 'Weak',
           satellites: hasSatelliteData ? 1 : 0
         });
@@ -57,11 +63,42 @@ const Dashboard = () => {
     // Fetch immediately
     fetchSystemStatus();
 
-    // Then fetch every 10 seconds to keep data fresh
-    const interval = setInterval(fetchSystemStatus, 10000);
+    // Then listen for job and SatDump progress events pushed by the backend
+    const source = new EventSource('http://localhost:5000/events');
+
+    const updateJob = (job) => {
+      if (job.state === 'queued' || job.state === 'running') {
+        activeJobs[job.id] = job;
+      } else {
+        delete activeJobs[job.id];
+      }
+      setSystemStatus(prev => ({ ...prev, tracking: isTracking() ? 'Active' : 'Inactive' }));
+    };
+
+    source.addEventListener('status', (event) => {
+      const status = JSON.parse(event.data);
+      status.jobs.forEach(updateJob);
+      setSystemStatus(prev => ({ ...prev, antenna: 'Connected' }));
+    });
+
+    source.addEventListener('job', (event) => updateJob(JSON.parse(event.data)));
+
+    source.addEventListener('progress', (event) => {
+      const progress = JSON.parse(event.data);
+      if (progress.lock !== undefined) {
+        setSystemStatus(prev => ({ ...prev, signal: progress.lock ? 'Strong' : 'Weak' }));
+      } else if (progress.snr !== undefined) {
+        setSystemStatus(prev => ({ ...prev, signal: progress.snr > 3 ? 'Strong' : 'Weak' }));
+      }
+    });
+
+    // EventSource reconnects on its own; show the backend as down until it does
+    source.onerror = () => {
+      setSystemStatus(prev => ({ ...prev, antenna: 'Disconnected', signal: 'Weak' }));
+    };
 
-    // Cleanup interval on component unmount
-    return () => clearInterval(interval);
+    // Close the event stream on component unmount
+    return () => source.close();
   }, []);
 
   const statusCards = [
@@ -1,54 +1,26 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { Image, Download, Eye, Calendar, Satellite } from 'lucide-react';
 import './ViewImages.css';
 
+const API_URL = 'http://localhost:5000';
+
 const ViewImages = () => {
   const [selectedImage, setSelectedImage] = useState(null);
   const [filter, setFilter] = useState('all');
 
-  // Sample image data - replace with your actual image data
-  const images = [
-    {
-      id: 1,
-      name: 'ISS_Pass_001.jpg',
-      date: '2024-01-15',
-      time: '14:30:25',
-      satellite: 'ISS',
-      size: '2.4 MB',
-      resolution: '1920x1080',
-      url: '/api/images/iss_pass_001.jpg'
-    },
-    {
-      id: 2,
-      name: 'NOAA_18_Image_002.jpg',
-      date: '2024-01-15',
-      time: '16:45:12',
-      satellite: 'NOAA-18',
-      size: '3.1 MB',
-      resolution: '2048x1536',
-      url: '/api/images/noaa_18_002.jpg'
-    },
-    {
-      id: 3,
-      name: 'METEOR_M2_003.jpg',
-      date: '2024-01-14',
-      time: '09:22:45',
-      satellite: 'METEOR-M2',
-      size: '1.8 MB',
-      resolution: '1600x1200',
-      url: '/api/images/meteor_m2_003.jpg'
-    },
-    {
-      id: 4,
-      name: 'ISS_Pass_004.jpg',
-      date: '2024-01-14',
-      time: '11:15:30',
-      satellite: 'ISS',
-      size: '2.7 MB',
-      resolution: '1920x1080',
-      url: '/api/images/iss_pass_004.jpg'
-    }
-  ];
+  const [images, setImages] = useState([]);
+
+  // Gallery index from the backend; thumbnails and full images are served by /api/images
+  useEffect(() => {
+    fetch(`${API_URL}/api/images`)
+      .then(response => response.json())
+      .then(data => {
+        if (data.success) {
+          setImages(data.images);
+        }
+      })
+      .catch(error => console.error('Error loading images:', error));
+  }, []);
 
   const filteredImages = filter === 'all' 
     ? images 
@@ -59,9 +31,10 @@ const ViewImages = () => {
   };
 
   const handleDownload = (image) => {
-    // Implement download functionality
-    //Images from SatDump or similar can be downloaded here
-    console.log('Downloading:', image.name);
+    const link = document.createElement('a');
+    link.href = `${API_URL}${image.url}`;
+    link.download = image.name;
+    link.click();
   };
 
   const handleCloseModal = () => {
@@ -103,9 +76,7 @@ const ViewImages = () => {
         {filteredImages.map(image => (
           <div key={image.id} className="image-card" onClick={() => handleImageClick(image)}>
             <div className="image-preview">
-              <div className="image-placeholder">
-                <Image className="placeholder-icon" />
-              </div>
+              <img src={`${API_URL}${image.thumbnail}`} alt={image.name} loading="lazy" />
               <div className="image-overlay">
                 <Eye className="overlay-icon" />
               </div>
@@ -146,10 +117,7 @@ const ViewImages = () => {
             
             <div className="modal-body">
               <div className="modal-image">
-                <div className="image-placeholder-large">
-                  <Image className="placeholder-icon-large" />
-                  <p>Image Preview</p>
-                </div>
+                <img src={`${API_URL}${selectedImage.url}`} alt={selectedImage.name} />
               </div>
               
               <div className="modal-info">